@@ -10,13 +10,24 @@ Usage (in GitHub Actions):
 """
 
 import os
+import re
 import sys
 import json
+import random
+import shutil
+import signal
 import subprocess
+import tempfile
+from datetime import datetime, timezone
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import IO, Callable, Deque, Iterator, List, Dict, Any, Optional, Set, Tuple
 import time
 import logging
+import threading
 
 try:
     import anthropic
@@ -25,10 +36,14 @@ except ImportError:
     subprocess.run([sys.executable, "-m", "pip", "install", "anthropic"], check=True)
     import anthropic
 
-from anthropic import RateLimitError
+from anthropic import APIStatusError
 
 # Import our function parser
-from function_parser import FunctionParser, validate_function_exists, FunctionSignature
+from function_parser import FunctionParser, FunctionSignature
+from check_directives import repair_check_directives
+from llm_cache import LLMCache
+from rate_limiter import ConcurrencyController
+import config
 
 
 # Setup logging
@@ -42,90 +57,764 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Function (or test target) the current thread is working on; several are
+# processed at once, so their log lines interleave in testgen.log
+_log_context = threading.local()
+
+
+class FunctionContextFilter(logging.Filter):
+    """Prefix log messages with the current thread's function, e.g. [setBit] ATTEMPT 1/3"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        name = getattr(_log_context, "name", None)
+        if name is not None:
+            record.msg = f"[{name}] {record.msg}"
+        return True
+
+
+logger.addFilter(FunctionContextFilter())
+
+
+@contextmanager
+def log_context(name: str) -> Iterator[None]:
+    """Tag this thread's log messages with `name` for the duration of the block"""
+    previous = getattr(_log_context, "name", None)
+    _log_context.name = name
+    try:
+        yield
+    finally:
+        _log_context.name = previous
+
+
 # Standardized error prefix for consistent error checking
 ERROR_PREFIX = "ERROR: "
 
+# Optimization levels every test is validated against
+OPTIMIZATIONS = ["Debug", "MinSize", "MaxSpeed"]
+
+# Output budget for a single multi-function generation request (model output limit;
+# responses are streamed, so long requests are fine) and functions per request
+BULK_MAX_TOKENS = 64000
+BULK_GROUP_SIZE = 8
+
+# Retried in call_claude: 429 rate limited, 529 overloaded
+RETRY_STATUS_CODES = (429, 529)
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Multi-file responses: "=== FILE: <name> ===" ... "=== END ==="
+FILE_BLOCK_RE = re.compile(r'^=== FILE: (\S+) ===[ \t]*\n(.*?)^=== END ===', re.MULTILINE | re.DOTALL)
+
+# Characters of streamed output after which overlapping work is started
+STREAM_OUTPUT_THRESHOLD = 200
+
+# Initial generation is open-ended; CHECK fixes are mechanical edits against
+# given assembly and go to the cheaper model first
+GENERATION_MODEL = "claude-sonnet-4-20250514"
+FIX_MODEL = "claude-haiku-4-5"
+
+# (input, output) cost per 1M tokens in USD
+MODEL_RATES = {
+    "claude-sonnet-4-20250514": (3.0, 15.0),
+    "claude-haiku-4-5": (1.0, 5.0),
+}
+
+# Compiler caches live outside the library repo
+COMPILER_CACHE_DIR = Path.home() / ".cache" / "armcortexm-testgen"
+
+# Command output kept for error logs and fix prompts
+OUTPUT_TAIL_BYTES = 16384
+
+# FileCheck directive lines ("// CHECK:", "// MINSIZE-NEXT:", ...) and the
+# context sent around them when asking for line edits
+CHECK_LINE_RE = re.compile(r'^\s*//\s*[A-Z][A-Z0-9_]*(?:-[A-Z]+)?:')
+CHECK_REGION_CONTEXT = 2
+
+# Lines of build/test output per failed optimization sent with a fix request
+FIX_LOG_LINES = 40
+
+# Files whose changes require re-running the CMake configure step
+CONFIGURE_INPUTS = ("CMakeLists.txt", "CMakePresets.json", "CMakeUserPresets.json")
+
+# Output budgets: default, whole-file CHECK fix, and CHECK fix in line-edit form
+DEFAULT_MAX_TOKENS = 8000
+FIX_FILE_MAX_TOKENS = 12000
+FIX_PATCH_MAX_TOKENS = 2000
+
+# Generated tests are about as long as their pattern; headroom on its token count
+MAX_TOKENS_HEADROOM = 1.3
+# Weight of the newest response in the per-prompt-type output length average
+OUTPUT_EWMA_WEIGHT = 0.3
+
+# Message Batches API: billed at half price, polled with exponential backoff (seconds)
+BATCH_PRICE_MULTIPLIER = 0.5
+BATCH_POLL_INITIAL = 60
+BATCH_POLL_MAX = 300
+
+
+# Role and requirements common to every generation prompt (part of the cached prefix)
+GENERATION_INSTRUCTIONS = """You are an expert in ARM Cortex-M assembly and C++ embedded systems testing.
+
+REQUIREMENTS FOR EVERY TEST FILE:
+1. Test all integer types: uint8_t, uint16_t, uint32_t, uint64_t, int8_t, int16_t, int32_t, int64_t
+2. For each type, test bit positions: 0, middle bit, MSB
+3. Include CHECK directives for DEBUG, MINSIZE, MAXSPEED optimizations
+4. Use extern "C" [[gnu::naked]] for all test functions
+5. For signed types checking MSB: bit 7 of int8_t and bit 15 of int16_t become bit 31 after sign extension
+6. MAXSPEED optimization adds NOP padding for alignment
+7. Each function ends with CHECK-EMPTY:
+"""
+
+# Prompt templates, filled with str.format_map. Kept at module level so every
+# request renders byte-identical text around the values it fills in, which
+# keeps the cached system prefix stable across calls
+HEADER_BLOCK_TEMPLATE = """{instructions}
+HEADER FILE ({header_name}):
+```cpp
+{header}
+```"""
+
+PATTERN_BLOCK_TEMPLATE = """PATTERN TO FOLLOW ({pattern_name}):
+```cpp
+{pattern}
+```"""
+
+SIGNATURE_NOTES_TEMPLATES = {
+    "void-modifying": """
+IMPORTANT NOTES ABOUT {function_name}():
+- This function MODIFIES a reference parameter: {first_parameter}
+- Assembly will include MEMORY OPERATIONS (ldr/str instructions)
+- The value is loaded, modified, and stored back
+""",
+    "bool-returning": """
+IMPORTANT NOTES ABOUT {function_name}():
+- This function RETURNS a bool value
+- Assembly will use comparison and conditional instructions
+- No memory writes, only reads and comparisons
+""",
+    "value-returning": """
+IMPORTANT NOTES ABOUT {function_name}():
+- This function returns: {return_type}
+- Parameters: {parameters}
+""",
+}
+
+GENERATION_PROMPT_TEMPLATE = """TASK: Generate {file_name} following the EXACT pattern.
+
+FUNCTION SIGNATURE:
+```cpp
+{return_type} {function_name}({parameters})
+```
+
+{signature_notes}
+
+OUTPUT: The complete C++ test file only. No explanations, no markdown, just the raw C++ code."""
+
+BULK_TASK_TEMPLATE = """{index}. {file_name} (follow {pattern_name})
+```cpp
+{return_type} {function_name}({parameters})
+```
+{signature_notes}"""
+
+BULK_PROMPT_TEMPLATE = """TASK: Generate one test file per function below, each following the EXACT pattern named for it.
+
+{task_list}
+OUTPUT: Every file as raw C++ code (no markdown) wrapped in delimiter lines:
+=== FILE: test_<name>_runtime.cpp ===
+<complete C++ source>
+=== END ===
+No explanations outside the delimited files."""
+
+FIX_REQUIREMENTS = """REQUIREMENTS:
+1. Update CHECK directives to match actual assembly
+2. Keep exact same structure and test functions
+3. Only change CHECK-NEXT: lines
+4. Remember: MAXSPEED adds NOP padding
+5. Keep CHECK-EMPTY: at end of functions"""
+
+FIX_PATCH_PROMPT_TEMPLATE = """The test file has CHECK directive mismatches. Fix them.
+
+CHECK DIRECTIVES OF THE TEST FILE (with line numbers; "..." marks omitted lines):
+```cpp
+{check_regions}
+```
+
+ACTUAL ASSEMBLY OUTPUTS:
+{assembly_sections}
+""" + FIX_REQUIREMENTS + """
+
+OUTPUT: A JSON array of line edits only, no explanations:
+[{{"line": <line number>, "old": "<current line text>", "new": "<replacement text>"}}, ...]
+"new" may contain several lines separated by \\n to insert lines, or be "" to delete the line."""
+
+FIX_FILE_PROMPT_TEMPLATE = """The test file has CHECK directive mismatches. Fix them.
+
+CURRENT TEST FILE:
+```cpp
+{test_code}
+```
+
+ACTUAL ASSEMBLY OUTPUTS:
+{assembly_sections}
+""" + FIX_REQUIREMENTS + """
+
+OUTPUT: The complete corrected C++ test file only. No explanations, just the code."""
+
+
+def parse_file_blocks(text: str) -> Dict[str, str]:
+    """Split a multi-file response into {file name: code} using the FILE/END delimiters"""
+    return {
+        match.group(1): match.group(2).strip() + "\n"
+        for match in FILE_BLOCK_RE.finditer(text)
+        if match.group(2).strip()
+    }
+
+
+def parse_line_edits(text: str) -> List[Dict[str, Any]]:
+    """Extract a JSON array of line edits from a Claude response"""
+    start = text.find("[")
+    end = text.rfind("]")
+    if start == -1 or end < start:
+        raise ValueError("No JSON array in response")
+    try:
+        edits = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in response: {e}") from e
+    if not isinstance(edits, list) or not all(
+        isinstance(edit, dict) and isinstance(edit.get("line"), int)
+        and isinstance(edit.get("old"), str) and isinstance(edit.get("new"), str)
+        for edit in edits
+    ):
+        raise ValueError("Edits must be objects with int 'line' and str 'old'/'new'")
+    return edits
+
+
+def apply_line_edits(code: str, edits: List[Dict[str, Any]]) -> str:
+    """
+    Apply line edits to source code.
+    
+    Line numbers are 1-based and refer to the original code. Each edit's
+    'old' text must match the current line (ignoring surrounding whitespace),
+    otherwise ValueError is raised and nothing is applied.
+    """
+    lines = code.split("\n")
+    seen = set()
+    for edit in edits:
+        index = edit["line"] - 1
+        if not 0 <= index < len(lines):
+            raise ValueError(f"Line {edit['line']} is out of range")
+        if index in seen:
+            raise ValueError(f"Line {edit['line']} is edited twice")
+        if lines[index].strip() != edit["old"].strip():
+            raise ValueError(f"Line {edit['line']} does not match: {edit['old']!r}")
+        seen.add(index)
+    
+    # Apply bottom-up so earlier line numbers stay valid when lines are inserted or deleted
+    for edit in sorted(edits, key=lambda e: e["line"], reverse=True):
+        index = edit["line"] - 1
+        lines[index:index + 1] = edit["new"].split("\n") if edit["new"] else []
+    return "\n".join(lines)
+
+
+def number_check_regions(code: str, context: int = CHECK_REGION_CONTEXT) -> str:
+    """
+    Number only the FileCheck directive lines and `context` lines around them.
+    
+    Gaps between regions are shown as "...", so line numbers stay those of
+    the full file and line edits against the excerpt apply to the file.
+    """
+    lines = code.split("\n")
+    keep = set()
+    for index, line in enumerate(lines):
+        if CHECK_LINE_RE.match(line):
+            keep.update(range(max(0, index - context), min(len(lines), index + context + 1)))
+    
+    excerpt = []
+    previous = -1
+    for index in sorted(keep):
+        if index != previous + 1:
+            excerpt.append("  ...")
+        excerpt.append(f"{index + 1:4d}| {lines[index]}")
+        previous = index
+    if previous != len(lines) - 1:
+        excerpt.append("  ...")
+    return "\n".join(excerpt)
+
+
+def run_streaming(command: List[str], cwd: Path, timeout: float, env: Optional[Dict[str, str]] = None,
+                  tail_bytes: int = OUTPUT_TAIL_BYTES) -> Tuple[int, str]:
+    """
+    Run a command, returning its exit code and the tail of its combined output.
+    
+    Output is read line by line in a background thread and logged at debug
+    level as it arrives; only the last ~tail_bytes are kept, so large build
+    logs are never held in memory. A command that exceeds the timeout is
+    killed and reported as failed rather than raising.
+    """
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, bufsize=1, errors="replace", start_new_session=True)
+    tail: Deque[str] = deque()
+    tail_size = 0
+    
+    def read_output() -> None:
+        nonlocal tail_size
+        for line in process.stdout:
+            logger.debug(f"[{command[0]}] {line.rstrip()}")
+            tail.append(line)
+            tail_size += len(line)
+            while tail_size > tail_bytes and len(tail) > 1:
+                tail_size -= len(tail.popleft())
+    
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+    try:
+        returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        # Kill the whole group: compiler children would keep the pipe open
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.wait()
+        reader.join()
+        tail.append(f"\n{' '.join(command)} timed out after {timeout}s\n")
+        return -1, "".join(tail)
+    reader.join()
+    return returncode, "".join(tail)
+
+
+def retry_delay(error: APIStatusError, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a rate-limited/overloaded request.
+    
+    Uses the server's retry-after (or the latest anthropic-ratelimit-*-reset
+    time) when given, otherwise exponential backoff capped at RETRY_MAX_DELAY.
+    Jitter keeps concurrent workers from retrying in lockstep.
+    """
+    backoff = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+    jitter = random.uniform(0, backoff * 0.1)
+    
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(RETRY_MAX_DELAY, float(retry_after)) + jitter
+        except ValueError:
+            pass
+    
+    # e.g. anthropic-ratelimit-tokens-reset: 2025-05-14T12:00:30Z
+    now = datetime.now(timezone.utc)
+    resets = []
+    for name, value in headers.items():
+        if name.lower().startswith("anthropic-ratelimit-") and name.lower().endswith("-reset"):
+            try:
+                reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            resets.append((reset - now).total_seconds())
+    waits = [wait for wait in resets if wait > 0]
+    if waits:
+        return min(RETRY_MAX_DELAY, max(waits)) + jitter
+    
+    return backoff + jitter
+
+
+@lru_cache(maxsize=64)
+def read_text_cached(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Read a text file, memoized on its path and (mtime_ns, size).
+    
+    Rewritten files get a new key, so stale text is never returned; the
+    header and pattern text put in the cached system prefix stay
+    byte-identical between requests.
+    """
+    return Path(path).read_text()
+
+
+def estimate_tokens(prompt: str, system: Optional[List[Dict[str, Any]]] = None) -> int:
+    """Rough input token count of a request (~4 characters per token)"""
+    characters = len(prompt) + sum(len(block["text"]) for block in system or [])
+    return characters // 4 + 1
+
+
+@contextmanager
+def open_atomic(path: Path) -> Iterator[IO[str]]:
+    """
+    Open a temporary file next to `path` for writing.
+    
+    It replaces `path` when the block completes and is removed if the block
+    raises, so readers never see a partially written file.
+    """
+    handle, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w") as sink:
+            yield sink
+        os.chmod(tmp_name, 0o644)  # mkstemp creates the file private
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def tail_lines(output: str, count: int = 20) -> str:
+    """Last lines of a command's output, for logging errors without cutting lines in half"""
+    return "\n".join(output.rstrip().splitlines()[-count:])
+
+
+def cached_text_block(text: str) -> Dict[str, Any]:
+    """Build a text content block marked for Anthropic prompt caching"""
+    return {
+        "type": "text",
+        "text": text,
+        "cache_control": {"type": "ephemeral"}
+    }
+
 
 class AutonomousTestGenerator:
     """Single Claude agent that generates, compiles, and validates tests autonomously"""
     
-    def __init__(self, repo_path: Path, api_key: str, max_cost: float = 50.0, module: str = "bit_utils"):
+    def __init__(self, repo_path: Path, api_key: str, max_cost: float = 50.0, module: str = "bit_utils",
+                 use_batch_api: bool = False, cache: Optional[LLMCache] = None, cache_strict: bool = False,
+                 max_tokens: Optional[int] = None, use_ninja: bool = False, max_concurrency: int = 3,
+                 fix_model: str = FIX_MODEL):
         self.repo_path = Path(repo_path)
         self.client = anthropic.Anthropic(api_key=api_key)
+        self.model = GENERATION_MODEL
+        self.fix_model = fix_model
+        # Low temp for consistency; strict caching needs fully deterministic responses
+        self.temperature = 0.0 if cache_strict else 0.2
+        self.cache = cache
+        # Cache keys behind the function the current thread is working on, and
+        # per function the keys of the bulk response its initial code came from
+        self._cache_key_log = threading.local()
+        self._initial_cache_keys: Dict[str, List[str]] = {}
         self.max_cost = max_cost
         self.module = module
+        self.use_batch_api = use_batch_api
+        self.max_concurrency = max_concurrency
+        # Overrides the output budget derived from the pattern size
+        self.max_tokens_override = max_tokens
+        self._pattern_token_counts: Dict[str, int] = {}
+        # Running average of output tokens per prompt type, for adaptive max_tokens
+        self._output_ewma: Dict[str, float] = {}
         self.total_input_tokens = 0
         self.total_output_tokens = 0
         self.total_cost = 0.0
+        # Worst-case cost of Claude calls in flight
+        self.reserved_cost = 0.0
+        
+        self.total_cache_creation_tokens = 0
+        self.total_cache_read_tokens = 0
+        
+        # Functions are processed concurrently; these guard the shared state
+        self._usage_lock = threading.Lock()
+        self._cmake_lists_lock = threading.Lock()
+        self._configure_lock = threading.Lock()
+        # Builds of different tests share a preset's build tree, so one at a time per preset
+        self._preset_locks = {
+            f"m0-gcc-{optimization.lower()}": threading.RLock() for optimization in OPTIMIZATIONS
+        }
+        
+        # Prompt-cache pricing relative to the base input rate
+        self.cache_write_multiplier = 1.25
+        self.cache_read_multiplier = 0.1
+        
+        # Paces concurrent calls under the account's RPM/TPM limits
+        self.limiter = ConcurrencyController(config.RATE_LIMIT_RPM, config.RATE_LIMIT_TPM)
         
-        # Cost per 1M tokens
-        self.input_cost_per_million = 3.0
-        self.output_cost_per_million = 15.0
+        # The optimization levels build concurrently, so split the cores between them
+        self.build_jobs = max(1, (os.cpu_count() or 2) // len(OPTIMIZATIONS))
+        
+        # Configure runs started while a Claude response is still streaming
+        self._configure_executor = ThreadPoolExecutor(max_workers=len(OPTIMIZATIONS))
+        self._pending_configures: Dict[str, Future] = {}
+        # Build/test runs, one worker per optimization level. Shared by all
+        # functions: builds of a preset are serialized by its lock anyway
+        self._compile_executor = ThreadPoolExecutor(max_workers=len(OPTIMIZATIONS))
+        # Resolved once; the header is read for every function
+        self._header_path: Optional[Path] = None
+        self._test_dir: Optional[Path] = None
+        
+        # Presets whose build tree has been configured by this process
+        self._configured_presets: Set[str] = set()
+        
+        # Extra configure arguments and build environment; a compiler cache
+        # makes rebuilds of unchanged sources near-free
+        self.configure_args: List[str] = []
+        self.build_env = dict(os.environ)
+        launcher = self.compiler_launcher()
+        if launcher is not None:
+            self.configure_args += [
+                f"-DCMAKE_{lang}_COMPILER_LAUNCHER={launcher}" for lang in ("C", "CXX", "ASM")
+            ]
+            # Also picked up by presets/toolchains that read the environment
+            for lang in ("C", "CXX"):
+                self.build_env.setdefault(f"CMAKE_{lang}_COMPILER_LAUNCHER", launcher)
+            # Outside the repo so the cache never ends up in the generated PR;
+            # relative paths let other checkouts share the cached objects
+            self.build_env.setdefault("CCACHE_DIR", str(COMPILER_CACHE_DIR / "ccache"))
+            self.build_env.setdefault("SCCACHE_DIR", str(COMPILER_CACHE_DIR / "sccache"))
+            self.build_env.setdefault("CCACHE_BASEDIR", str(self.repo_path.resolve()))
+        
+        # Ninja configures faster and rebuilds single files with less overhead than Make
+        self.use_ninja = use_ninja
         
         logger.info(f"Initialized generator for module: {module}")
         logger.info(f"Repository path: {repo_path}")
         logger.info(f"Max cost: ${max_cost}")
+        if use_batch_api:
+            logger.info("Initial generation via Message Batches API")
+        if cache is not None:
+            logger.info(f"Response cache: {cache.cache_dir}")
+            if not cache_strict:
+                logger.info("  (temperature > 0: cached responses are one sample, not the only answer)")
+    
+    def calculate_cost(self, input_tokens: int, output_tokens: int,
+                       cache_creation_tokens: int = 0, cache_read_tokens: int = 0,
+                       model: Optional[str] = None) -> float:
+        """Calculate API cost (cache writes bill at 1.25x input, cache reads at 0.1x)"""
+        input_rate, output_rate = MODEL_RATES[model or self.model]
+        input_cost = (input_tokens / 1_000_000) * input_rate
+        cache_write_cost = (cache_creation_tokens / 1_000_000) * input_rate * self.cache_write_multiplier
+        cache_read_cost = (cache_read_tokens / 1_000_000) * input_rate * self.cache_read_multiplier
+        output_cost = (output_tokens / 1_000_000) * output_rate
+        return input_cost + cache_write_cost + cache_read_cost + output_cost
+    
+    def build_request(self, prompt: str, max_tokens: int,
+                      system: Optional[List[Dict[str, Any]]] = None,
+                      model: Optional[str] = None) -> Dict[str, Any]:
+        """Build Messages API parameters shared by direct and batch calls"""
+        request = {
+            "model": model or self.model,
+            "max_tokens": max_tokens,
+            "temperature": self.temperature,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if system:
+            request["system"] = system
+        return request
     
-    def calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
-        """Calculate API cost"""
-        input_cost = (input_tokens / 1_000_000) * self.input_cost_per_million
-        output_cost = (output_tokens / 1_000_000) * self.output_cost_per_million
-        return input_cost + output_cost
+    def record_usage(self, usage: Any, price_multiplier: float = 1.0, model: Optional[str] = None) -> float:
+        """Add a response's token usage to the running totals and return its cost"""
+        cache_creation_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        cost = price_multiplier * self.calculate_cost(usage.input_tokens, usage.output_tokens,
+                                                      cache_creation_tokens, cache_read_tokens, model)
+        
+        with self._usage_lock:
+            self.total_input_tokens += usage.input_tokens
+            self.total_output_tokens += usage.output_tokens
+            self.total_cache_creation_tokens += cache_creation_tokens
+            self.total_cache_read_tokens += cache_read_tokens
+            self.total_cost += cost
+        
+        logger.info(f"   Input tokens: {usage.input_tokens:,}")
+        if cache_creation_tokens or cache_read_tokens:
+            logger.info(f"   Cache tokens: {cache_creation_tokens:,} written, "
+                        f"{cache_read_tokens:,} read")
+        logger.info(f"   Output tokens: {usage.output_tokens:,}")
+        logger.info(f"   Call cost: ${cost:.4f}")
+        logger.info(f"   Total cost so far: ${self.total_cost:.4f}")
+        return cost
     
-    def call_claude(self, prompt: str, max_tokens: int = 8000) -> str:
-        """Make API call to Claude with rate limit handling"""
-        logger.info("Calling Claude API...")
+    def call_claude(self, prompt: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                    system: Optional[List[Dict[str, Any]]] = None,
+                    on_first_output: Optional[Callable[[], None]] = None,
+                    kind: Optional[str] = None, model: Optional[str] = None,
+                    output_path: Optional[Path] = None) -> str:
+        """
+        Make a streaming API call to Claude with rate limit handling.
         
-        max_retries = 5
-        for attempt in range(max_retries):
-            try:
-                response = self.client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=max_tokens,
-                    temperature=0.2,  # Low temp for consistency
-                    messages=[{"role": "user", "content": prompt}]
+        Args:
+            prompt: Per-call user message
+            max_tokens: Maximum tokens to generate
+            system: Optional system content blocks; blocks marked with
+                cache_control are served from the prompt cache on repeat calls
+            on_first_output: Called once the response starts arriving, so
+                independent work can overlap with the rest of the decode
+            kind: Prompt type (e.g. "initial", "fix"); max_tokens is then
+                lowered to fit the output lengths seen for that type so far,
+                and a response truncated by that is retried with max_tokens
+            model: Model to use instead of the generation model
+            output_path: File to also write the response to; it is streamed
+                into a temporary file next to it and moved into place once
+                complete, so the file is ready as soon as the stream ends
+        """
+        model = model or self.model
+        cache_key = None
+        if self.cache is not None:
+            cache_key = LLMCache.make_key(self.build_request(prompt, max_tokens, system, model))
+            keys = getattr(self._cache_key_log, "keys", None)
+            if keys is not None:
+                keys.append(cache_key)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Using cached Claude response")
+                if output_path is not None:
+                    with open_atomic(output_path) as sink:
+                        sink.write(cached)
+                return cached
+        
+        logger.info(f"Calling Claude API ({model})...")
+        
+        cap = max_tokens
+        if kind is not None:
+            max_tokens = self.adaptive_max_tokens(kind, cap)
+        request = self.build_request(prompt, max_tokens, system, model)
+        input_tokens = self.count_input_tokens(request)
+        # Worst case for the tokens/minute bucket; settled with the real usage
+        token_estimate = input_tokens + max_tokens
+        
+        # Held until the call finishes so concurrent calls cannot overshoot together
+        projected = self.reserve_budget(input_tokens, max_tokens, model, cached=bool(system))
+        try:
+            max_retries = 5
+            for attempt in range(max_retries):
+                try:
+                    chunks = []
+                    received = 0
+                    reserved = self.limiter.reserve(token_estimate)
+                    used = 0
+                    try:
+                        with self.client.messages.stream(**request) as stream, \
+                                (open_atomic(output_path) if output_path is not None else nullcontext()) as sink:
+                            for text in stream.text_stream:
+                                chunks.append(text)
+                                if sink is not None:
+                                    sink.write(text)
+                                if on_first_output is not None and received < STREAM_OUTPUT_THRESHOLD:
+                                    received += len(text)
+                                    if received >= STREAM_OUTPUT_THRESHOLD:
+                                        on_first_output()
+                            response = stream.get_final_message()
+                        used = (response.usage.input_tokens + response.usage.output_tokens +
+                                (getattr(response.usage, "cache_creation_input_tokens", None) or 0))
+                    finally:
+                        self.limiter.settle(reserved, used)
+                    
+                    self.record_usage(response.usage, model=model)
+                    truncated = response.stop_reason == "max_tokens"
+                    if truncated:
+                        logger.warning(f"⚠️ Response truncated at max_tokens={max_tokens}")
+                    if kind is not None:
+                        self.record_output_tokens(kind, response.usage.output_tokens)
+                    
+                    if truncated and max_tokens < cap and attempt < max_retries - 1:
+                        logger.info(f"Retrying with max_tokens={cap}")
+                        max_tokens = cap
+                        request = self.build_request(prompt, max_tokens, system, model)
+                        # This call's cost is already recorded; swap its reservation for
+                        # the larger one rather than holding both
+                        self.release_budget(projected)
+                        projected = 0.0
+                        projected = self.reserve_budget(input_tokens, max_tokens, model, cached=bool(system))
+                        token_estimate = input_tokens + max_tokens
+                        continue
+                    
+                    text = "".join(chunks)
+                    if truncated:
+                        # Incomplete output; never cache it, or every rerun would replay it
+                        logger.error(f"❌ Response still truncated at max_tokens={max_tokens}, "
+                                     f"not caching it")
+                    elif cache_key is not None:
+                        self.cache.set(cache_key, text, model)
+                    return text
+                    
+                except APIStatusError as e:
+                    if e.status_code not in RETRY_STATUS_CODES:
+                        raise
+                    reason = "Rate limited" if e.status_code == 429 else "API overloaded"
+                    if attempt < max_retries - 1:
+                        wait_time = retry_delay(e, attempt)
+                        logger.warning(f"⏳ {reason}, waiting {wait_time:.1f}s... (attempt {attempt + 1}/{max_retries})")
+                        time.sleep(wait_time)
+                    else:
+                        logger.error(f"❌ {reason} after all retries")
+                        raise
+        finally:
+            self.release_budget(projected)
+    
+    def count_input_tokens(self, request: Dict[str, Any]) -> int:
+        """Input tokens of a request, counted by the API (estimated if counting fails)"""
+        params = {key: request[key] for key in ("model", "system", "messages") if key in request}
+        try:
+            return self.client.messages.count_tokens(**params).input_tokens
+        except anthropic.APIError as e:
+            logger.debug(f"Could not count input tokens, estimating: {e}")
+            return estimate_tokens(request["messages"][0]["content"], request.get("system"))
+    
+    def reserve_budget(self, input_tokens: int, max_tokens: int, model: str, cached: bool = False,
+                       price_multiplier: float = 1.0) -> float:
+        """
+        Reserve a request's worst-case cost, refusing it if the run could go over max_cost.
+        
+        Spent and in-flight reserved costs are checked and updated under one
+        lock, so concurrent calls cannot all pass the check and overshoot
+        together. Returns the reserved amount for release_budget().
+        """
+        # Worst case: every input token written to the prompt cache (when the
+        # request has cacheable blocks) and a response using all of max_tokens
+        if cached:
+            projected = self.calculate_cost(0, max_tokens, cache_creation_tokens=input_tokens, model=model)
+        else:
+            projected = self.calculate_cost(input_tokens, max_tokens, model=model)
+        projected *= price_multiplier
+        
+        with self._usage_lock:
+            committed = self.total_cost + self.reserved_cost
+            if committed + projected > self.max_cost:
+                raise RuntimeError(
+                    f"Cost limit ${self.max_cost} would be exceeded!\n"
+                    f"   Spent: ${self.total_cost:.2f}, in flight: up to ${self.reserved_cost:.2f}, "
+                    f"next request: up to ${projected:.2f}\n"
+                    f"   Suggestion: Increase --max-cost to continue"
                 )
-                
-                # Track usage
-                self.total_input_tokens += response.usage.input_tokens
-                self.total_output_tokens += response.usage.output_tokens
-                
-                cost = self.calculate_cost(response.usage.input_tokens, response.usage.output_tokens)
-                self.total_cost += cost
-                
-                logger.info(f"   Input tokens: {response.usage.input_tokens:,}")
-                logger.info(f"   Output tokens: {response.usage.output_tokens:,}")
-                logger.info(f"   Call cost: ${cost:.4f}")
-                logger.info(f"   Total cost so far: ${self.total_cost:.4f}")
-                
-                if self.total_cost > self.max_cost:
-                    raise RuntimeError(
-                        f"Cost limit ${self.max_cost} exceeded!\n"
-                        f"   Spent: ${self.total_cost:.2f}\n"
-                        f"   Suggestion: Increase --max-cost to continue"
-                    )
-                
-                return response.content[0].text
-                
-            except RateLimitError as e:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt  # Exponential backoff: 1, 2, 4, 8, 16 seconds
-                    logger.warning(f"⏳ Rate limited, waiting {wait_time}s... (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
-                    logger.error("❌ Rate limit exceeded after all retries")
-                    raise
+            self.reserved_cost += projected
+        return projected
+    
+    def release_budget(self, projected: float) -> None:
+        """Drop a reservation once the call's actual cost has been recorded (or it failed)"""
+        with self._usage_lock:
+            self.reserved_cost -= projected
+    
+    def adaptive_max_tokens(self, kind: str, cap: int) -> int:
+        """Output budget for a prompt type: ~1.5x its typical output length, at most cap"""
+        if self.max_tokens_override:
+            return cap
+        with self._usage_lock:
+            ewma = self._output_ewma.get(kind)
+        if ewma is None:
+            return cap
+        return min(cap, int(ewma * 1.5) + 512)
+    
+    def record_output_tokens(self, kind: str, output_tokens: int) -> None:
+        """Fold a response's output length into the running average for its prompt type"""
+        with self._usage_lock:
+            ewma = self._output_ewma.get(kind)
+            self._output_ewma[kind] = (
+                output_tokens if ewma is None
+                else OUTPUT_EWMA_WEIGHT * output_tokens + (1 - OUTPUT_EWMA_WEIGHT) * ewma
+            )
     
     def read_file(self, relative_path: str) -> str:
-        """Read file from repo"""
+        """Read file from repo, reusing the cached text while the file is unchanged"""
         file_path = self.repo_path / relative_path
-        if not file_path.exists():
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
             error_msg = f"File not found: {relative_path}"
             logger.error(error_msg)
             return f"{ERROR_PREFIX}{error_msg}"
+        except Exception as e:
+            error_msg = f"Error reading {relative_path}: {e}"
+            logger.error(error_msg)
+            return f"{ERROR_PREFIX}{error_msg}"
         
         try:
-            content = file_path.read_text()
+            content = read_text_cached(str(file_path), stat.st_mtime_ns, stat.st_size)
             logger.debug(f"Read {relative_path} ({len(content)} bytes)")
             return content
         except Exception as e:
@@ -147,6 +836,9 @@ class AutonomousTestGenerator:
     
     def get_header_path(self) -> Path:
         """Get path to the header file for current module"""
+        if self._header_path is not None:
+            return self._header_path
+        
         # Bug #16 fix: Remove useless if statement and add validation
         header_path = self.repo_path / f"{self.module}.hpp"
         
@@ -156,10 +848,14 @@ class AutonomousTestGenerator:
             logger.info(f"Module: {self.module}")
             raise FileNotFoundError(f"Header file not found: {header_path}")
         
+        self._header_path = header_path
         return header_path
     
     def get_test_dir(self) -> Path:
         """Get path to test directory for current module"""
+        if self._test_dir is not None:
+            return self._test_dir
+        
         # Bug #17 fix: Create directory if it doesn't exist
         test_dir = self.repo_path / "tests" / self.module.replace("/", "_")
         
@@ -169,84 +865,263 @@ class AutonomousTestGenerator:
             test_dir.mkdir(parents=True, exist_ok=True)
             logger.info(f"✓ Created test directory: {test_dir}")
         
+        self._test_dir = test_dir
         return test_dir
     
-    def validate_function(self, function_name: str) -> Optional[FunctionSignature]:
-        """Validate that function exists and get its signature"""
-        header_path = self.get_header_path()
+    def validate_functions(self, functions: List[str]) -> Optional[Dict[str, FunctionSignature]]:
+        """
+        Validate that every function exists and get the signatures.
+        
+        The header is parsed once for all functions. Returns None (after
+        logging every missing name) if any function is not found or the
+        module's header is missing.
+        """
+        try:
+            header_path = self.get_header_path()
+        except FileNotFoundError as e:
+            logger.error(f"Cannot validate functions: {e}")
+            return None
+        header = self.read_file(header_path.name)
+        if header.startswith(ERROR_PREFIX):
+            return None
         
-        logger.info(f"Validating function '{function_name}' in {header_path.name}...")
-        signature = validate_function_exists(header_path, function_name)
+        logger.info(f"Validating {len(functions)} function(s) in {header_path.name}...")
+        signatures = FunctionParser(header).parse_all(functions)
         
-        if signature is None:
+        missing = [name for name in functions if name not in signatures]
+        for function_name in missing:
             logger.error(f"Function '{function_name}' not found in {header_path.name}")
+        if missing:
             return None
         
-        logger.info(f"✓ Found function: {signature.name}")
-        logger.info(f"  Return type: {signature.return_type}")
-        logger.info(f"  Parameters: {signature.parameters}")
-        logger.info(f"  Modifies reference: {signature.modifies_reference}")
-        logger.info(f"  Pattern file: {signature.pattern_file}")
-        logger.info(f"  Test type: {signature.test_type}")
+        for signature in signatures.values():
+            logger.info(f"✓ Found function: {signature.name}")
+            logger.info(f"  Return type: {signature.return_type}")
+            logger.info(f"  Parameters: {signature.parameters}")
+            logger.info(f"  Modifies reference: {signature.modifies_reference}")
+            logger.info(f"  Pattern file: {signature.pattern_file}")
+            logger.info(f"  Test type: {signature.test_type}")
         
-        return signature
+        return signatures
     
-    def compile_and_test(self, test_name: str, optimization: str) -> Dict[str, Any]:
-        """Compile and run tests for a specific optimization level"""
-        preset = f"m0-gcc-{optimization.lower()}"
+    @staticmethod
+    def compiler_launcher() -> Optional[str]:
+        """Find a compiler cache (ccache, else sccache) to use as the compiler launcher"""
+        for launcher in ("ccache", "sccache"):
+            try:
+                result = subprocess.run([launcher, "--version"], capture_output=True, timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                continue
+            if result.returncode == 0:
+                logger.info(f"✓ Using {launcher} as compiler launcher")
+                return launcher
         
-        logger.info(f"Compiling {optimization}...")
+        logger.warning("ccache not found - every retry recompiles from scratch")
+        logger.info("  Install it for faster rebuilds: apt-get install ccache")
+        return None
+    
+    def preset_generator(self, preset: str) -> Optional[str]:
+        """Return the generator a configure preset pins (following inherits), if any"""
+        presets = {}
+        for presets_file in ("CMakePresets.json", "CMakeUserPresets.json"):
+            try:
+                data = json.loads((self.repo_path / presets_file).read_text())
+            except (OSError, ValueError):
+                continue
+            for entry in data.get("configurePresets", []):
+                presets[entry.get("name")] = entry
         
-        # Configure
-        result = subprocess.run(
-            ["cmake", "--preset", preset],
-            cwd=self.repo_path,
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
-        if result.returncode != 0:
-            logger.error(f"Configure failed: {result.stderr[:200]}")
+        pending = [preset]
+        seen = set()
+        while pending:
+            entry = presets.get(pending.pop(0))
+            if entry is None or entry["name"] in seen:
+                continue
+            seen.add(entry["name"])
+            if entry.get("generator"):
+                return entry["generator"]
+            inherits = entry.get("inherits", [])
+            pending.extend([inherits] if isinstance(inherits, str) else inherits)
+        return None
+    
+    def generator_args(self, preset: str) -> List[str]:
+        """Select Ninja for presets that leave the generator open"""
+        if not self.use_ninja or self.preset_generator(preset) is not None:
+            return []
+        
+        # CMake refuses to switch generators in an existing build tree
+        cmake_cache = self.repo_path / "build" / preset / "CMakeCache.txt"
+        try:
+            for line in cmake_cache.read_text().splitlines():
+                if line.startswith("CMAKE_GENERATOR:") and not line.endswith("=Ninja"):
+                    logger.warning(f"{preset} is already configured with another generator, not using Ninja")
+                    return []
+        except OSError:
+            pass
+        return ["-G", "Ninja"]
+    
+    def configure(self, preset: str) -> Dict[str, Any]:
+        """Run the CMake configure step for a preset"""
+        with self._preset_locks[preset]:
+            returncode, output = run_streaming(
+                ["cmake", "--preset", preset, *self.generator_args(preset), *self.configure_args],
+                cwd=self.repo_path,
+                env=self.build_env,
+                timeout=120
+            )
+        if returncode != 0:
+            logger.error(f"Configure failed:\n{tail_lines(output)}")
             return {
                 "success": False,
                 "stage": "configure",
-                "output": result.stderr
+                "output": output
             }
+        self._configured_presets.add(preset)
+        return {"success": True, "stage": "configure", "output": output}
+    
+    def is_configured(self, preset: str) -> bool:
+        """
+        Check whether a preset's build tree is configured and still current.
+        
+        The tree must be newer than the top-level CMakeLists.txt and the
+        preset files; edits to the tests' CMakeLists.txt are picked up by
+        cmake --build itself. A tree configured by an earlier run is reused
+        when its cache already has this run's configure options.
+        """
+        cmake_cache = self.repo_path / "build" / preset / "CMakeCache.txt"
+        try:
+            cache_mtime = cmake_cache.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        
+        for name in CONFIGURE_INPUTS:
+            try:
+                if (self.repo_path / name).stat().st_mtime > cache_mtime:
+                    return False
+            except FileNotFoundError:
+                continue
+        
+        if preset in self._configured_presets:
+            return True
+        if self.cache_has_options(cmake_cache, preset):
+            logger.debug(f"Reusing {preset} build tree from a previous run")
+            self._configured_presets.add(preset)
+            return True
+        return False
+    
+    def cache_has_options(self, cmake_cache: Path, preset: str) -> bool:
+        """Check that a CMakeCache.txt was configured with this run's -D options and generator"""
+        try:
+            entries = {}
+            for line in cmake_cache.read_text().splitlines():
+                name, sep, value = line.partition("=")
+                if sep and not line.startswith(("#", "//")):
+                    entries[name.split(":", 1)[0]] = value
+        except OSError:
+            return False
+        
+        expected = dict(arg[len("-D"):].partition("=")[::2] for arg in self.configure_args)
+        for lang in ("C", "CXX", "ASM"):
+            # A launcher from an earlier run may no longer be installed
+            expected.setdefault(f"CMAKE_{lang}_COMPILER_LAUNCHER", "")
+        if any(entries.get(name, "") != value for name, value in expected.items()):
+            return False
+        generator = self.generator_args(preset)
+        return not generator or entries.get("CMAKE_GENERATOR") == generator[-1]
+    
+    def start_background_configure(self) -> None:
+        """
+        Start configuring every preset in the background.
+        
+        Configuring does not depend on the test file, so it can run while
+        Claude is still writing it. compile_and_test picks up the result.
+        """
+        with self._configure_lock:
+            for optimization in OPTIMIZATIONS:
+                preset = f"m0-gcc-{optimization.lower()}"
+                if preset not in self._pending_configures and not self.is_configured(preset):
+                    logger.debug(f"Configuring {preset} in the background")
+                    self._pending_configures[preset] = self._configure_executor.submit(self.configure, preset)
+    
+    def compile_and_test(self, test_name: str, optimization: str) -> Dict[str, Any]:
+        """Compile and run tests for a specific optimization level"""
+        # Runs on a compile worker thread, so tag its log lines with the test here
+        with log_context(test_name):
+            return self._compile_and_test(test_name, optimization)
+    
+    def _compile_and_test(self, test_name: str, optimization: str) -> Dict[str, Any]:
+        preset = f"m0-gcc-{optimization.lower()}"
+        
+        logger.info(f"Compiling {optimization}...")
+        
+        # Wait for a configure started while Claude was responding
+        with self._configure_lock:
+            pending = self._pending_configures.pop(preset, None)
+        if pending is not None:
+            result = pending.result()
+            if not result["success"]:
+                return result
+        
+        with self._preset_locks[preset]:
+            # Configure, skipped entirely once the build tree is configured
+            if not self.is_configured(preset):
+                result = self.configure(preset)
+                if not result["success"]:
+                    return result
+            
+            return self.build_and_test(test_name, optimization)
+    
+    def compile_all(self, test_name: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Compile and test every optimization level concurrently.
+        
+        Each level has its own build directory (build/<preset>), so the
+        pipelines are independent; wall-clock time is the slowest level
+        rather than the sum. Results are returned in OPTIMIZATIONS order.
+        """
+        futures = {
+            optimization: self._compile_executor.submit(self.compile_and_test, test_name, optimization)
+            for optimization in OPTIMIZATIONS
+        }
+        return {optimization: future.result() for optimization, future in futures.items()}
+    
+    def build_and_test(self, test_name: str, optimization: str) -> Dict[str, Any]:
+        """Build a test target and run it in an already configured preset"""
+        preset = f"m0-gcc-{optimization.lower()}"
         
         # Build
-        result = subprocess.run(
-            ["cmake", "--build", "--preset", preset, "--target", test_name],
+        returncode, output = run_streaming(
+            ["cmake", "--build", "--preset", preset, "--target", test_name,
+             "--parallel", str(self.build_jobs)],
             cwd=self.repo_path,
-            capture_output=True,
-            text=True,
+            env=self.build_env,
             timeout=180
         )
-        if result.returncode != 0:
-            logger.error(f"Build failed: {result.stderr[:200]}")
+        if returncode != 0:
+            logger.error(f"Build failed:\n{tail_lines(output)}")
             return {
                 "success": False,
                 "stage": "build",
-                "output": result.stderr
+                "output": output
             }
         
         # Test
-        result = subprocess.run(
-            ["ctest", "--preset", preset, "-R", test_name, "-V"],
+        returncode, output = run_streaming(
+            ["ctest", "--preset", preset, "-R", test_name, "-V", "-j", str(self.build_jobs)],
             cwd=self.repo_path,
-            capture_output=True,
-            text=True,
+            env=self.build_env,
             timeout=60
         )
         
-        if result.returncode == 0:
+        if returncode == 0:
             logger.info(f"✓ {optimization} tests passed")
         else:
             logger.warning(f"✗ {optimization} tests failed")
         
         return {
-            "success": result.returncode == 0,
+            "success": returncode == 0,
             "stage": "test",
-            "output": result.stdout + "\n" + result.stderr
+            "output": output
         }
     
     def read_assembly(self, test_name: str, optimization: str) -> str:
@@ -263,20 +1138,8 @@ class AutonomousTestGenerator:
         
         return asm_path.read_text()
     
-    def generate_test(self, function_name: str) -> bool:
-        """Generate and validate tests for a single function"""
-        
-        logger.info("=" * 70)
-        logger.info(f"GENERATING TESTS FOR {function_name}()")
-        logger.info("=" * 70)
-        
-        # Validate function exists and get signature
-        signature = self.validate_function(function_name)
-        if signature is None:
-            return False
-        
-        # Read context - use appropriate pattern based on function signature
-        logger.info("Reading existing patterns...")
+    def load_pattern(self, signature: FunctionSignature) -> Optional[str]:
+        """Read the test pattern matching the function's signature"""
         test_dir = self.get_test_dir()
         pattern_file = test_dir / signature.pattern_file
         
@@ -285,121 +1148,351 @@ class AutonomousTestGenerator:
             logger.info("Available patterns:")
             for p in test_dir.glob("test_*_runtime.cpp"):
                 logger.info(f"  - {p.name}")
-            return False
+            return None
         
-        existing_test = pattern_file.read_text()
+        existing_test = self.read_file(str(pattern_file.relative_to(self.repo_path)))
+        if existing_test.startswith(ERROR_PREFIX):
+            return None
         logger.info(f"✓ Read pattern ({len(existing_test)} bytes): {pattern_file.name}")
+        return existing_test
+    
+    def build_context_blocks(self, header: str, patterns: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Build the cached system blocks shared by every generation prompt.
+        
+        Instructions, header and patterns are identical for every function
+        sharing a pattern (and across retries), so they go first as cached
+        system blocks; only the task and signature notes stay in the user
+        message. The header block comes first so functions using a different
+        pattern still hit the cached header prefix.
+        """
+        blocks = [
+            cached_text_block(HEADER_BLOCK_TEMPLATE.format_map({
+                "instructions": GENERATION_INSTRUCTIONS,
+                "header_name": self.get_header_path().name,
+                "header": header
+            }))
+        ]
+        for pattern_name, pattern in patterns.items():
+            blocks.append(cached_text_block(PATTERN_BLOCK_TEMPLATE.format_map({
+                "pattern_name": pattern_name,
+                "pattern": pattern
+            })))
+        return blocks
+    
+    def signature_fields(self, signature: FunctionSignature) -> Dict[str, str]:
+        """Template values describing a function to test"""
+        return {
+            "function_name": signature.name,
+            "file_name": f"test_{signature.name.lower()}_runtime.cpp",
+            "pattern_name": signature.pattern_file,
+            "return_type": signature.return_type,
+            "parameters": ", ".join(signature.parameters),
+            "first_parameter": signature.parameters[0] if signature.parameters else ""
+        }
+    
+    def get_signature_notes(self, signature: FunctionSignature) -> str:
+        """Build signature-aware instructions for the generation prompt"""
+        return SIGNATURE_NOTES_TEMPLATES[signature.test_type].format_map(self.signature_fields(signature))
+    
+    def estimate_max_tokens(self, pattern_name: str, existing_test: str) -> int:
+        """
+        Size the output budget for generating one test file.
+        
+        A generated test is about as long as the pattern it follows, so the
+        budget is the pattern's token count plus 30% headroom. Counts are
+        measured once per pattern.
+        """
+        if self.max_tokens_override is not None:
+            return self.max_tokens_override
+        
+        if pattern_name not in self._pattern_token_counts:
+            try:
+                count = self.client.messages.count_tokens(
+                    model=self.model,
+                    messages=[{"role": "user", "content": existing_test}]
+                )
+            except anthropic.APIError as e:
+                logger.warning(f"Could not count pattern tokens, using {DEFAULT_MAX_TOKENS}: {e}")
+                return DEFAULT_MAX_TOKENS
+            self._pattern_token_counts[pattern_name] = count.input_tokens
+            logger.info(f"Pattern {pattern_name}: {count.input_tokens:,} tokens")
+        
+        return int(self._pattern_token_counts[pattern_name] * MAX_TOKENS_HEADROOM)
+    
+    def build_generation_prompt(self, signature: FunctionSignature) -> Optional[Tuple[List[Dict[str, Any]], str, int]]:
+        """Build the (system blocks, user prompt, max_tokens) for a single function's initial generation"""
+        # Read context - use appropriate pattern based on function signature
+        logger.info("Reading existing patterns...")
+        existing_test = self.load_pattern(signature)
+        if existing_test is None:
+            return None
         
         header = self.read_file(self.get_header_path().name)
         if header.startswith(ERROR_PREFIX):
-            return False
+            return None
         logger.info(f"✓ Read header file ({len(header)} bytes)")
         
-        # Generate initial test with signature-aware prompt
-        logger.info(f"Generating test code for {function_name}()...")
+        system = self.build_context_blocks(header, {signature.pattern_file: existing_test})
         
-        # Build signature-aware instructions
-        if signature.test_type == "void-modifying":
-            signature_notes = f"""
-IMPORTANT NOTES ABOUT {function_name}():
-- This function MODIFIES a reference parameter: {signature.parameters[0]}
-- Assembly will include MEMORY OPERATIONS (ldr/str instructions)
-- The value is loaded, modified, and stored back
-"""
-        elif signature.test_type == "bool-returning":
-            signature_notes = f"""
-IMPORTANT NOTES ABOUT {function_name}():
-- This function RETURNS a bool value
-- Assembly will use comparison and conditional instructions
-- No memory writes, only reads and comparisons
-"""
-        else:
-            signature_notes = f"""
-IMPORTANT NOTES ABOUT {function_name}():
-- This function returns: {signature.return_type}
-- Parameters: {', '.join(signature.parameters)}
-"""
+        prompt = GENERATION_PROMPT_TEMPLATE.format_map({
+            **self.signature_fields(signature),
+            "signature_notes": self.get_signature_notes(signature)
+        })
         
-        prompt = f"""You are an expert in ARM Cortex-M assembly and C++ embedded systems testing.
-
-TASK: Generate test_{function_name.lower()}_runtime.cpp following the EXACT pattern.
-
-FUNCTION SIGNATURE:
-```cpp
-{signature.return_type} {signature.name}({', '.join(signature.parameters)})
-```
-
-{signature_notes}
-
-HEADER FILE ({self.get_header_path().name}):
-```cpp
-{header}
-```
-
-PATTERN TO FOLLOW ({signature.pattern_file}):
-```cpp
-{existing_test}
-```
-
-REQUIREMENTS:
-1. Test all integer types: uint8_t, uint16_t, uint32_t, uint64_t, int8_t, int16_t, int32_t, int64_t
-2. For each type, test bit positions: 0, middle bit, MSB
-3. Include CHECK directives for DEBUG, MINSIZE, MAXSPEED optimizations
-4. Use extern "C" [[gnu::naked]] for all test functions
-5. For signed types checking MSB: bit 7 of int8_t and bit 15 of int16_t become bit 31 after sign extension
-6. MAXSPEED optimization adds NOP padding for alignment
-7. Each function ends with CHECK-EMPTY:
-
-OUTPUT: The complete C++ test file only. No explanations, no markdown, just the raw C++ code."""
-
-        test_code = self.call_claude(prompt)
+        return system, prompt, self.estimate_max_tokens(signature.pattern_file, existing_test)
+    
+    def generate_tests_batch_api(self, signatures: Dict[str, FunctionSignature]) -> Dict[str, str]:
+        """
+        Generate the initial test files through the Message Batches API.
+        
+        Batches are billed at half price and use a separate rate-limit pool,
+        which suits overnight runs. Results can take a while, so the batch is
+        polled with exponential backoff. Fix-retry rounds stay synchronous.
+        
+        Returns:
+            Mapping of function name to generated test code. Functions whose
+            batch request failed are left out, so callers fall back to
+            generating them individually.
+        """
+        logger.info("=" * 70)
+        logger.info(f"SUBMITTING BATCH FOR {len(signatures)} FUNCTIONS")
+        logger.info("=" * 70)
+        
+        requests = []
+        for function_name, signature in signatures.items():
+            generation_prompt = self.build_generation_prompt(signature)
+            if generation_prompt is None:
+                continue
+            system, prompt, max_tokens = generation_prompt
+            requests.append({
+                "custom_id": function_name,
+                "params": self.build_request(prompt, max_tokens, system)
+            })
+        
+        if not requests:
+            return {}
+        
+        # The whole batch's worst case at batch pricing is held against max_cost
+        # until its results are recorded
+        projected = self.reserve_budget(
+            sum(self.count_input_tokens(request["params"]) for request in requests),
+            sum(request["params"]["max_tokens"] for request in requests),
+            self.model,
+            cached=any("system" in request["params"] for request in requests),
+            price_multiplier=BATCH_PRICE_MULTIPLIER
+        )
+        try:
+            batch = self.client.messages.batches.create(requests=requests)
+            logger.info(f"Submitted batch {batch.id} with {len(requests)} requests")
+            
+            delay = BATCH_POLL_INITIAL
+            while batch.processing_status != "ended":
+                logger.info(f"Batch {batch.processing_status} "
+                            f"({batch.request_counts.processing} processing), "
+                            f"checking again in {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, BATCH_POLL_MAX)
+                batch = self.client.messages.batches.retrieve(batch.id)
+            
+            generated = {}
+            for entry in self.client.messages.batches.results(batch.id):
+                if entry.result.type != "succeeded":
+                    logger.warning(f"Batch request for {entry.custom_id} {entry.result.type}")
+                    continue
+                message = entry.result.message
+                logger.info(f"Batch result for {entry.custom_id}:")
+                self.record_usage(message.usage, price_multiplier=BATCH_PRICE_MULTIPLIER)
+                generated[entry.custom_id] = message.content[0].text
+        finally:
+            self.release_budget(projected)
+        
+        logger.info(f"✓ Batch generated {len(generated)}/{len(requests)} test files")
+        return generated
+    
+    def generate_tests_bulk(self, signatures: Dict[str, FunctionSignature]) -> Iterator[Dict[str, str]]:
+        """
+        Generate the initial test files for several functions per request.
+        
+        Functions are sent in groups of up to BULK_GROUP_SIZE; the header and
+        patterns go once per group (and are prompt-cached across groups)
+        instead of once per function. Fix-retry rounds stay per-function in
+        generate_test.
+        
+        Yields:
+            Mapping of function name to generated test code, one per group as
+            soon as it arrives, so callers can start building a group while
+            the next one is generated. Functions whose pattern is missing or
+            that are missing from the response are left out, so callers fall
+            back to generating them individually.
+        """
+        logger.info("=" * 70)
+        logger.info(f"BULK GENERATING TESTS FOR {len(signatures)} FUNCTIONS")
+        logger.info("=" * 70)
+        
+        patterns = {}
+        for signature in signatures.values():
+            if signature.pattern_file not in patterns:
+                existing_test = self.load_pattern(signature)
+                if existing_test is not None:
+                    patterns[signature.pattern_file] = existing_test
+        signatures = {
+            name: signature for name, signature in signatures.items() if signature.pattern_file in patterns
+        }
+        
+        if not signatures:
+            return
         
-        # Write test file
+        header = self.read_file(self.get_header_path().name)
+        if header.startswith(ERROR_PREFIX):
+            return
+        
+        # Same system blocks for every group so they stay a cache hit
+        system = self.build_context_blocks(header, patterns)
+        
+        names = list(signatures)
+        for start in range(0, len(names), BULK_GROUP_SIZE):
+            group = {name: signatures[name] for name in names[start:start + BULK_GROUP_SIZE]}
+            generated = self.generate_group(group, patterns, system)
+            logger.info(f"✓ Bulk generated {len(generated)}/{len(group)} test files")
+            yield generated
+    
+    def generate_group(self, signatures: Dict[str, FunctionSignature], patterns: Dict[str, str],
+                       system: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Generate one group of test files in a single request using the FILE/END protocol"""
+        file_names = {f"test_{name.lower()}_runtime.cpp": name for name in signatures}
+        max_tokens = sum(
+            self.estimate_max_tokens(signature.pattern_file, patterns[signature.pattern_file])
+            for signature in signatures.values()
+        )
+        
+        tasks = []
+        for index, (file_name, function_name) in enumerate(file_names.items(), start=1):
+            signature = signatures[function_name]
+            tasks.append(BULK_TASK_TEMPLATE.format_map({
+                **self.signature_fields(signature),
+                "index": index,
+                "signature_notes": self.get_signature_notes(signature)
+            }))
+        
+        prompt = BULK_PROMPT_TEMPLATE.format_map({"task_list": "\n".join(tasks)})
+        
+        self._cache_key_log.keys = []
+        try:
+            response = self.call_claude(
+                prompt,
+                max_tokens=min(max_tokens, BULK_MAX_TOKENS),
+                system=system,
+                on_first_output=self.start_background_configure
+            )
+        finally:
+            keys, self._cache_key_log.keys = self._cache_key_log.keys, None
+        files = parse_file_blocks(response)
+        
+        generated = {}
+        for file_name, function_name in file_names.items():
+            code = files.get(file_name)
+            if code:
+                generated[function_name] = code
+                # Dropped along with the function's own responses if its tests fail
+                self._initial_cache_keys[function_name] = keys
+            else:
+                logger.warning(f"Bulk response is missing {file_name}")
+        return generated
+    
+    def generate_test(self, signature: FunctionSignature, initial_code: Optional[str] = None) -> bool:
+        """
+        Generate and validate tests for a single function.
+        
+        Cached Claude responses that led to tests that do not pass are
+        dropped from the response cache, so rerunning the function asks
+        Claude again instead of replaying the same failure for free.
+        
+        Args:
+            signature: Validated signature of the function to generate tests for
+            initial_code: Test code already generated (e.g. by generate_tests_bulk);
+                skips the initial Claude call when given
+        """
+        self._cache_key_log.keys = list(self._initial_cache_keys.pop(signature.name, []))
+        success = False
+        try:
+            # Everything logged while working on this function is tagged with its name
+            with log_context(signature.name):
+                success = self._generate_test(signature, initial_code)
+            return success
+        finally:
+            keys, self._cache_key_log.keys = self._cache_key_log.keys, None
+            if not success and self.cache is not None and keys:
+                logger.info(f"Dropping {len(keys)} cached response(s) behind {signature.name}()")
+                self.cache.discard(keys)
+    
+    def _generate_test(self, signature: FunctionSignature, initial_code: Optional[str]) -> bool:
+        """generate_test without the cache bookkeeping"""
+        function_name = signature.name
+        
+        logger.info("=" * 70)
+        logger.info(f"GENERATING TESTS FOR {function_name}()")
+        logger.info("=" * 70)
+        
+        test_dir = self.get_test_dir()
         test_filename = f"test_{function_name.lower()}_runtime.cpp"
         test_path = test_dir / test_filename
         test_name = f"test_{function_name.lower()}_runtime"
         
-        logger.info(f"Writing {test_path.relative_to(self.repo_path)}...")
-        if not self.write_file(str(test_path.relative_to(self.repo_path)), test_code):
-            return False
+        if initial_code is not None:
+            logger.info(f"Using pre-generated test code for {function_name}()")
+            test_code = initial_code
+            logger.info(f"Writing {test_path.relative_to(self.repo_path)}...")
+            if not self.write_file(str(test_path.relative_to(self.repo_path)), test_code):
+                return False
+        else:
+            # Generate initial test with signature-aware prompt
+            generation_prompt = self.build_generation_prompt(signature)
+            if generation_prompt is None:
+                return False
+            system, prompt, max_tokens = generation_prompt
+            
+            # Written to the test file while it streams in
+            logger.info(f"Generating {test_path.relative_to(self.repo_path)}...")
+            test_code = self.call_claude(prompt, max_tokens=max_tokens, system=system,
+                                         on_first_output=self.start_background_configure, kind="initial",
+                                         output_path=test_path)
         
-        # Update CMakeLists.txt
+        # Update CMakeLists.txt (read-modify-write, shared by concurrently processed functions)
         cmake_path = test_dir / "CMakeLists.txt"
-        cmake_content = self.read_file(str(cmake_path.relative_to(self.repo_path)))
-        
-        # Bug #12 fix: Validate CMakeLists.txt read before using it
-        if cmake_content.startswith(ERROR_PREFIX):
-            logger.error(f"Cannot update CMakeLists.txt: {cmake_content}")
-            return False
-        
-        # Check if test already exists in CMakeLists.txt
-        test_declaration = f"add_asm_test({test_name})"
-        if test_declaration not in cmake_content:
-            # Add at the end, preserving formatting
-            if not cmake_content.endswith('\n'):
-                cmake_content += '\n'
-            cmake_content += f"{test_declaration}\n"
-            self.write_file(str(cmake_path.relative_to(self.repo_path)), cmake_content)
-            logger.info("✓ Updated CMakeLists.txt")
+        with self._cmake_lists_lock:
+            cmake_content = self.read_file(str(cmake_path.relative_to(self.repo_path)))
+            
+            # Bug #12 fix: Validate CMakeLists.txt read before using it
+            if cmake_content.startswith(ERROR_PREFIX):
+                logger.error(f"Cannot update CMakeLists.txt: {cmake_content}")
+                return False
+            
+            # Check if test already exists in CMakeLists.txt
+            test_declaration = f"add_asm_test({test_name})"
+            if test_declaration not in cmake_content:
+                # Add at the end, preserving formatting
+                if not cmake_content.endswith('\n'):
+                    cmake_content += '\n'
+                cmake_content += f"{test_declaration}\n"
+                self.write_file(str(cmake_path.relative_to(self.repo_path)), cmake_content)
+                logger.info("✓ Updated CMakeLists.txt")
         
         # Try to compile and test (with retries)
         max_attempts = 3
+        claude_fixes = 0
         for attempt in range(1, max_attempts + 1):
             logger.info("─" * 70)
             logger.info(f"ATTEMPT {attempt}/{max_attempts}")
             logger.info("─" * 70)
             
-            all_passed = True
-            failed_optimizations = []
+            failed_optimizations = [
+                (optimization, result)
+                for optimization, result in self.compile_all(test_name).items()
+                if not result["success"]
+            ]
             
-            for optimization in ["Debug", "MinSize", "MaxSpeed"]:
-                result = self.compile_and_test(test_name, optimization)
-                
-                if not result["success"]:
-                    all_passed = False
-                    failed_optimizations.append((optimization, result))
-            
-            if all_passed:
+            if not failed_optimizations:
                 logger.info(f"🎉 SUCCESS! All tests pass for {function_name}()")
                 return True
             
@@ -421,34 +1514,26 @@ OUTPUT: The complete C++ test file only. No explanations, no markdown, just the
                     logger.warning("Check compilation errors above")
                     # Show some error details
                     for opt, result in failed_optimizations:
-                        logger.error(f"{opt} failed at {result['stage']}: {result['output'][:300]}")
+                        logger.error(f"{opt} failed at {result['stage']}:\n{tail_lines(result['output'])}")
                     break  # Give up, not worth retrying
                 
-                # Ask Claude to fix
-                fix_prompt = f"""The test file has CHECK directive mismatches. Fix them.
-
-CURRENT TEST FILE:
-```cpp
-{test_code}
-```
-
-ACTUAL ASSEMBLY OUTPUTS:
-
-"""
-                for opt, asm in assemblies.items():
-                    fix_prompt += f"\n{opt}:\n```\n{asm}\n```\n"
+                # Most mismatches only differ in instruction text or NOP padding,
+                # which can be copied straight from the assembly without asking Claude
+                repaired = None
+                if len(assemblies) == len(failed_optimizations):
+                    all_assemblies = {opt: self.read_assembly(test_name, opt) for opt in OPTIMIZATIONS}
+                    if not any(asm.startswith(ERROR_PREFIX) for asm in all_assemblies.values()):
+                        repaired = repair_check_directives(test_code, all_assemblies)
                 
-                fix_prompt += """
-REQUIREMENTS:
-1. Update CHECK directives to match actual assembly
-2. Keep exact same structure and test functions
-3. Only change CHECK-NEXT: lines
-4. Remember: MAXSPEED adds NOP padding
-5. Keep CHECK-EMPTY: at end of functions
-
-OUTPUT: The complete corrected C++ test file only. No explanations, just the code."""
-
-                test_code = self.call_claude(fix_prompt, max_tokens=12000)
+                if repaired is not None:
+                    logger.info("✓ Repaired CHECK directives locally from assembly")
+                    test_code = repaired
+                else:
+                    # Ask Claude to fix; the cheap model first, escalating if its fix did not pass
+                    model = self.fix_model if claude_fixes == 0 else self.model
+                    failure_logs = {opt: tail_lines(result["output"], FIX_LOG_LINES) for opt, result in failed_optimizations}
+                    test_code = self.fix_check_directives(test_code, assemblies, model, failure_logs)
+                    claude_fixes += 1
                 
                 logger.info("Writing corrected version...")
                 self.write_file(str(test_path.relative_to(self.repo_path)), test_code)
@@ -456,6 +1541,45 @@ OUTPUT: The complete corrected C++ test file only. No explanations, just the cod
         logger.error(f"FAILED: Could not get tests passing after {max_attempts} attempts")
         return False
     
+    def fix_check_directives(self, test_code: str, assemblies: Dict[str, str],
+                             model: Optional[str] = None, failure_logs: Optional[Dict[str, str]] = None) -> str:
+        """
+        Ask Claude to fix CHECK directive mismatches against the actual assembly.
+        
+        Claude replies with line edits rather than the whole file, which cuts
+        the output tokens of a retry to a fraction. If the edits cannot be
+        parsed or applied, the complete corrected file is requested instead.
+        failure_logs (end of the build/FileCheck output per optimization)
+        show Claude which line failed and any compile errors.
+        """
+        assembly_sections = "".join(f"\n{opt}:\n```\n{asm}\n```\n" for opt, asm in assemblies.items())
+        if failure_logs:
+            assembly_sections += "\nFAILURE OUTPUT:\n" + "".join(
+                f"\n{opt}:\n```\n{log}\n```\n" for opt, log in failure_logs.items()
+            )
+        
+        patch_prompt = FIX_PATCH_PROMPT_TEMPLATE.format_map({
+            "check_regions": number_check_regions(test_code),
+            "assembly_sections": assembly_sections
+        })
+        
+        response = self.call_claude(patch_prompt, max_tokens=FIX_PATCH_MAX_TOKENS,
+                                    on_first_output=self.start_background_configure, kind="fix", model=model)
+        try:
+            fixed_code = apply_line_edits(test_code, parse_line_edits(response))
+            logger.info("✓ Applied CHECK directive edits")
+            return fixed_code
+        except ValueError as e:
+            logger.warning(f"Could not apply edits ({e}), requesting the complete file")
+        
+        fix_prompt = FIX_FILE_PROMPT_TEMPLATE.format_map({
+            "test_code": test_code,
+            "assembly_sections": assembly_sections
+        })
+        
+        return self.call_claude(fix_prompt, max_tokens=self.max_tokens_override or FIX_FILE_MAX_TOKENS,
+                                on_first_output=self.start_background_configure, kind="fix_file", model=model)
+    
     def run(self, functions: List[str]) -> Dict[str, Any]:
         """Run autonomous test generation for multiple functions"""
         
@@ -470,20 +1594,75 @@ OUTPUT: The complete corrected C++ test file only. No explanations, just the cod
         start_time = time.time()
         results = {}
         
-        for func in functions:
+        # Fail before spending anything if a requested function does not exist
+        signatures = self.validate_functions(functions)
+        if signatures is None:
+            # Nothing gets generated; every function shows up as failed in the summary
+            results = {
+                func: {"success": False, "error": "Function validation failed (see log above)"}
+                for func in functions
+            }
+            signatures = {}
+        
+        # Functions are independent (own test file and target), so API calls for
+        # one overlap with the builds of another
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures: Dict[Future, str] = {}
+            
+            def submit(initial_code: Dict[str, str]) -> None:
+                for func, code in initial_code.items():
+                    futures[executor.submit(self.generate_test, signatures[func], code)] = func
+            
+            # Generate the first version of the files in as few requests as
+            # possible; each bulk group starts building while the next one is
+            # generated. Anything missing from the responses gets its own request
             try:
-                success = self.generate_test(func)
-                results[func] = {
-                    "success": success,
-                    "error": None
-                }
-            except Exception as e:
-                logger.exception(f"ERROR processing {func}")
-                results[func] = {
-                    "success": False,
-                    "error": str(e)
-                }
-                break
+                if self.use_batch_api and signatures:
+                    submit(self.generate_tests_batch_api(signatures))
+                elif len(signatures) > 1:
+                    for initial_code in self.generate_tests_bulk(signatures):
+                        submit(initial_code)
+            except anthropic.APIError as e:
+                logger.warning(f"Bulk generation failed, generating individually: {e}")
+            except Exception:
+                # E.g. the cost limit; groups already submitted keep running and
+                # the rest fail (or succeed) individually, so the summary still prints
+                logger.exception("Bulk generation failed, generating individually")
+            except BaseException:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            
+            submitted = set(futures.values())
+            for func in signatures:
+                if func not in submitted:
+                    futures[executor.submit(self.generate_test, signatures[func])] = func
+            
+            for future in as_completed(futures):
+                func = futures[future]
+                if future.cancelled():
+                    results[func] = {
+                        "success": False,
+                        "error": "Not started after an earlier failure"
+                    }
+                    continue
+                try:
+                    success = future.result()
+                    results[func] = {
+                        "success": success,
+                        "error": None
+                    }
+                except Exception as e:
+                    logger.exception(f"ERROR processing {func}")
+                    results[func] = {
+                        "success": False,
+                        "error": str(e)
+                    }
+                    # Don't start any more functions (e.g. cost limit reached)
+                    for pending in futures:
+                        pending.cancel()
+        
+        results = {func: results[func] for func in functions if func in results}
         
         elapsed = time.time() - start_time
         
@@ -501,6 +1680,10 @@ OUTPUT: The complete corrected C++ test file only. No explanations, just the cod
         logger.info(f"\n⏱️  Time: {elapsed/60:.1f} minutes")
         logger.info(f"💰 Cost: ${self.total_cost:.2f}")
         logger.info(f"🎟️  Tokens: {self.total_input_tokens:,} in, {self.total_output_tokens:,} out")
+        logger.info(f"🗄️  Cache: {self.total_cache_creation_tokens:,} written, "
+                    f"{self.total_cache_read_tokens:,} read")
+        if self.cache is not None:
+            logger.info(f"📦 Response cache: {self.cache.hits} hits, {self.cache.misses} misses")
         logger.info("=" * 70)
         
         return {
@@ -541,6 +1724,50 @@ def main():
         default=50.0,
         help="Maximum API cost in USD (default: 50.0)"
     )
+    parser.add_argument(
+        "--use-batch-api",
+        action="store_true",
+        help="Submit initial generation through the Message Batches API (50%% cheaper, slower)"
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=None,
+        help="Output token budget for generation calls (default: pattern size + 30%%)"
+    )
+    parser.add_argument(
+        "--ninja",
+        action="store_true",
+        help="Configure with the Ninja generator when the CMake preset does not pin one"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=3,
+        help="Number of functions processed at the same time (default: 3)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call Claude instead of reusing responses from the on-disk cache"
+    )
+    parser.add_argument(
+        "--cache-ttl-days",
+        type=float,
+        default=None,
+        help="Ignore cached responses older than this many days (default: never expire)"
+    )
+    parser.add_argument(
+        "--cache-strict",
+        action="store_true",
+        help="Use temperature 0 so cached responses are exactly reproducible"
+    )
+    parser.add_argument(
+        "--fix-model",
+        choices=sorted(MODEL_RATES),
+        default=FIX_MODEL,
+        help=f"Model for the first CHECK directive fix; later fixes use {GENERATION_MODEL} (default: {FIX_MODEL})"
+    )
     
     args = parser.parse_args()
     
@@ -550,12 +1777,25 @@ def main():
         logger.error("ANTHROPIC_API_KEY environment variable not set")
         sys.exit(1)
     
+    if args.ninja and shutil.which("ninja") is None:
+        logger.error("--ninja requested but ninja is not installed (apt-get install ninja-build)")
+        sys.exit(1)
+    
+    cache = None if args.no_cache else LLMCache(ttl_days=args.cache_ttl_days)
+    
     # Run generator
     generator = AutonomousTestGenerator(
         repo_path=Path(args.repo_path),
         api_key=api_key,
         max_cost=args.max_cost,
-        module=args.module
+        module=args.module,
+        use_batch_api=args.use_batch_api,
+        cache=cache,
+        cache_strict=args.cache_strict,
+        max_tokens=args.max_tokens,
+        use_ninja=args.ninja,
+        max_concurrency=args.max_concurrency,
+        fix_model=args.fix_model
     )
     
     summary = generator.run(args.functions)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+FileCheck Directive Helpers
+
+Parses the CHECK directives of a test file and the disassembly it is
+checked against, so simple mismatches can be repaired locally:
+- CHECK-LABEL / CHECK-NEXT / CHECK-EMPTY blocks per test function
+- Per-function instruction lists from the generated .asm files
+- Trimming a disassembly to the functions a test checks
+- Rewriting CHECK-NEXT lines when only the instruction text differs,
+  and adding/removing trailing NOP padding (e.g. MAXSPEED alignment)
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+
+# "// CHECK-LABEL: <test_set_bit_u_8_0>:" (prefix may be per optimization, e.g. MINSIZE-LABEL)
+_LABEL_RE = re.compile(r'^\s*//\s*([A-Z][A-Z0-9_]*)-LABEL:\s*<?([\w.$]+)>?:?\s*$')
+_DIRECTIVE_RE = re.compile(r'^(\s*//\s*([A-Z][A-Z0-9_]*)-(NEXT|EMPTY):\s*)(.*?)\s*$')
+
+# "00000000 <test_set_bit_u_8_0>:" or "test_set_bit_u_8_0:"
+_ASM_LABEL_RE = re.compile(r'^(?:[0-9a-fA-F]+\s+)?<?([\w.$]+)>?:\s*$')
+# objdump address and encoding columns: "   0:	7803      	"
+_ASM_ADDRESS_RE = re.compile(r'^\s*[0-9a-fA-F]+:\s+(?:(?:[0-9a-fA-F]{8}|[0-9a-fA-F]{4})\s)*\s*')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Alignment padding: "nop" (objdump shows the Thumb-1 encoding as "nop ; (mov r8, r8)")
+_NOP_RE = re.compile(r'^nop(?:\.[nw])?$', re.IGNORECASE)
+
+
+@dataclass
+class CheckBlock:
+    """CHECK directives for one test function"""
+    prefix: str
+    function: str
+    next_lines: List[int]  # 0-based line indices of the -NEXT directives
+    has_empty: bool
+
+
+def parse_check_blocks(test_code: str) -> List[CheckBlock]:
+    """Find every LABEL block and the NEXT/EMPTY directives directly following it"""
+    lines = test_code.split("\n")
+    blocks = []
+    index = 0
+    while index < len(lines):
+        label = _LABEL_RE.match(lines[index])
+        index += 1
+        if not label:
+            continue
+
+        block = CheckBlock(prefix=label.group(1), function=label.group(2), next_lines=[], has_empty=False)
+        while index < len(lines):
+            directive = _DIRECTIVE_RE.match(lines[index])
+            if not directive or directive.group(2) != block.prefix:
+                break
+            index += 1
+            if directive.group(3) == "EMPTY":
+                block.has_empty = True
+                break
+            block.next_lines.append(index - 1)
+        blocks.append(block)
+
+    return blocks
+
+
+def normalize_instruction(line: str) -> str:
+    """Strip address/encoding columns and comments, collapse whitespace"""
+    line = _ASM_ADDRESS_RE.sub("", line)
+    for comment in ("@", ";"):
+        position = line.find(comment)
+        if position != -1:
+            line = line[:position]
+    return _WHITESPACE_RE.sub(" ", line).strip()
+
+
+def parse_asm_functions(asm: str) -> Dict[str, List[str]]:
+    """Map each labelled function in a disassembly to its normalized instructions"""
+    functions: Dict[str, List[str]] = {}
+    current: Optional[List[str]] = None
+    for line in asm.split("\n"):
+        if not line.strip():
+            current = None
+            continue
+        label = _ASM_LABEL_RE.match(line)
+        if label:
+            current = functions.setdefault(label.group(1), [])
+            continue
+        if current is not None:
+            instruction = normalize_instruction(line)
+            if instruction:
+                current.append(instruction)
+    return functions
+
+
+def extract_asm_functions(asm: str, names: Iterable[str]) -> str:
+    """
+    Keep only the disassembly of the named functions (label line included).
+
+    Functions are separated by blank lines, as in objdump output; the
+    result lists the kept functions in file order, one blank line apart.
+    """
+    wanted = set(names)
+    sections = []
+    current: Optional[List[str]] = None
+    for line in asm.split("\n"):
+        if not line.strip():
+            current = None
+            continue
+        label = _ASM_LABEL_RE.match(line)
+        if label:
+            current = [line] if label.group(1) in wanted else None
+            if current is not None:
+                sections.append(current)
+            continue
+        if current is not None:
+            current.append(line)
+    return "\n\n".join("\n".join(section) for section in sections)
+
+
+def is_nop(instruction: str) -> bool:
+    """Check whether a normalized instruction (or CHECK pattern) is a NOP"""
+    return bool(_NOP_RE.match(instruction.strip()))
+
+
+def split_padding(instructions: List[str]) -> int:
+    """Number of leading instructions before the trailing NOP padding"""
+    end = len(instructions)
+    while end > 0 and is_nop(instructions[end - 1]):
+        end -= 1
+    return end
+
+
+def prefix_for(optimization: str, prefixes: List[str]) -> Optional[str]:
+    """Pick the CHECK prefix an optimization level is verified with"""
+    for prefix in prefixes:
+        if optimization.upper() in prefix:
+            return prefix
+    return "CHECK" if "CHECK" in prefixes else None
+
+
+def matches(expected: str, actual: str) -> bool:
+    """FileCheck-style match: the pattern must be a substring of the line"""
+    if "{{" in expected or "[[" in expected:
+        return True  # Regex/variable patterns are left to FileCheck
+    return _WHITESPACE_RE.sub(" ", expected).strip() in actual
+
+
+def repair_check_directives(test_code: str, assemblies: Dict[str, str]) -> Optional[str]:
+    """
+    Rewrite CHECK-NEXT lines to match the actual assembly.
+
+    Handles mismatches in instruction text and in the amount of trailing
+    NOP padding, which is deterministic given the assembly. Returns None
+    when the fix is structural (a function is missing or has a different
+    number of real instructions), when optimizations sharing a prefix
+    disagree, or when nothing needed changing - those cases need Claude.
+
+    Args:
+        test_code: Current test file
+        assemblies: Disassembly per optimization level (e.g. "MinSize")
+    """
+    lines = test_code.split("\n")
+    blocks = parse_check_blocks(test_code)
+    prefixes = sorted({block.prefix for block in blocks})
+    replacements: Dict[int, str] = {}
+    # Trailing NOP count wanted per block (index into blocks)
+    padding: Dict[int, int] = {}
+
+    for optimization, asm in assemblies.items():
+        prefix = prefix_for(optimization, prefixes)
+        if prefix is None:
+            return None
+        functions = parse_asm_functions(asm)
+
+        for block_index, block in enumerate(blocks):
+            if block.prefix != prefix:
+                continue
+            actual = functions.get(block.function)
+            if actual is None:
+                return None
+            expected = [_DIRECTIVE_RE.match(lines[line_index]).group(4) for line_index in block.next_lines]
+            body = split_padding(actual)
+            if body != split_padding(expected):
+                return None
+
+            for line_index, instruction in zip(block.next_lines, actual[:body]):
+                directive = _DIRECTIVE_RE.match(lines[line_index])
+                wanted = directive.group(4) if matches(directive.group(4), instruction) else instruction
+                if replacements.setdefault(line_index, wanted) != wanted:
+                    return None  # Optimizations sharing this prefix need different text
+            if padding.setdefault(block_index, len(actual) - body) != len(actual) - body:
+                return None  # Optimizations sharing this prefix are padded differently
+
+    changed = False
+    for line_index, wanted in replacements.items():
+        directive = _DIRECTIVE_RE.match(lines[line_index])
+        if directive.group(4) != wanted:
+            lines[line_index] = directive.group(1) + wanted
+            changed = True
+
+    # Rewrite the padding bottom-up so earlier line indices stay valid
+    for block_index in sorted(padding, reverse=True):
+        block = blocks[block_index]
+        wanted_nops = padding[block_index]
+        expected = [_DIRECTIVE_RE.match(lines[line_index]).group(4) for line_index in block.next_lines]
+        body = split_padding(expected)
+        if len(expected) - body == wanted_nops:
+            continue
+        nop_lines = block.next_lines[body:]
+        insert_at = block.next_lines[body - 1] + 1 if body else block.next_lines[0] if block.next_lines else None
+        if insert_at is None:
+            return None  # No CHECK-NEXT line to copy the directive prefix from
+        lead = _DIRECTIVE_RE.match(lines[block.next_lines[0]]).group(1)
+        nop = expected[-1] if nop_lines else "nop"
+        del lines[insert_at:insert_at + len(nop_lines)]
+        lines[insert_at:insert_at] = [lead + nop] * wanted_nops
+        changed = True
+
+    return "\n".join(lines) if changed else None
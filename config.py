@@ -22,6 +22,10 @@ OUTPUT_TOKEN_COST = 15.0  # $15 per 1M output tokens
 MAX_RETRIES = 3
 TIMEOUT = 300  # 5 minutes
 
+# API rate limits (Tier 1); calls are paced to stay under these
+RATE_LIMIT_RPM = 50       # Requests per minute
+RATE_LIMIT_TPM = 40_000   # Input + output tokens per minute
+
 # Validation settings
 MAX_COMPILATION_ATTEMPTS = 3
 
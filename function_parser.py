@@ -10,12 +10,104 @@ Parses C++ function signatures from header files to determine:
 - Which test pattern to use
 """
 
+import os
 import re
+import sys
 from dataclasses import dataclass
-from typing import List, Optional
+from functools import cached_property, lru_cache
+from typing import Dict, Iterable, List, Optional, Pattern, Set
 from pathlib import Path
 
 
+# Compiled once per process rather than looked up in re's cache on every call
+# Line and block comments in one pass; whichever starts first wins, as in the compiler
+_COMMENT_RE = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+# Headers longer than this are stripped with str.find instead of the regex
+_FAST_STRIP_THRESHOLD = 64_000
+# list_all_functions: every word followed by "(" is a candidate (cheap to find), and
+# only candidates are checked for a parameter list and a preceding return type
+_CANDIDATE_RE = re.compile(r'\b(\w+)\s*\(')
+_PARAM_LIST_RE = re.compile(r'\s*\([^)]*\)')
+# Words that are followed by "(" without naming a function
+_NOT_FUNCTION_NAMES = frozenset({
+    'if', 'while', 'for', 'switch', 'return', 'sizeof', 'alignof', 'decltype',
+    'static_assert', 'noexcept', 'catch', 'throw', 'alignas', 'requires'
+})
+# Characters that matter when splitting a parameter list
+_PARAM_DELIM_RE = re.compile(r'[,<>()]')
+_VOID = sys.intern("void")
+# A const qualifier makes a reference parameter read-only (no lower() copy per parameter)
+_CONST_RE = re.compile(r'\bconst\b', re.IGNORECASE)
+# test_set_bit_runtime.cpp -> set_bit
+_TEST_FN_RE = re.compile(r'^test_(.+)_runtime\.cpp$')
+# set_bit -> setBit
+_CAMEL_RE = re.compile(r'_([a-zA-Z0-9])')
+
+
+@lru_cache(maxsize=32)
+def _strip_comments(content: str) -> str:
+    """Remove C++ comments; cached so parsers over the same header share the result"""
+    if len(content) > _FAST_STRIP_THRESHOLD:
+        return _strip_comments_fast(content)
+    return _COMMENT_RE.sub('', content)
+
+
+def _strip_comments_fast(content: str) -> str:
+    """
+    Same result as _COMMENT_RE.sub('', content), using str.find.
+    
+    Jumps from comment to comment and joins the surviving slices once,
+    which scales linearly on large headers (no regex backtracking over an
+    unterminated /*).
+    """
+    pieces = []
+    keep_from = 0
+    search_from = 0
+    block = line = -2  # Not searched yet
+    while True:
+        # Only re-search for a marker the scan has moved past; rescanning to a
+        # far-away (or absent) one on every iteration would be quadratic
+        if block == -2 or block != -1 and block < search_from:
+            block = content.find('/*', search_from)
+        if line == -2 or line != -1 and line < search_from:
+            line = content.find('//', search_from)
+        if block == -1 and line == -1:
+            break
+        start = line if block == -1 or (line != -1 and line < block) else block
+        
+        if start == line:
+            end = content.find('\n', start + 2)
+            end = len(content) if end == -1 else end
+        else:
+            end = content.find('*/', start + 2)
+            if end == -1:
+                # Unterminated: not a comment, like the regex - and no later
+                # /* can be terminated either
+                block = -1
+                search_from = start + 1
+                continue
+            end += 2
+        
+        pieces.append(content[keep_from:start])
+        keep_from = search_from = end
+    
+    pieces.append(content[keep_from:])
+    return ''.join(pieces)
+
+
+@lru_cache(maxsize=256)
+def _func_pattern(function_name: str) -> Pattern[str]:
+    """Compiled declaration/definition pattern for one function name"""
+    # Matches: [template<...>] [constexpr] [inline] [static] return_type function_name(params)
+    # Groups: 1 = template parameters, 2 = return type (including namespace), 3 = parameters;
+    # the name is known, so it is not captured
+    return re.compile(
+        r'(?:template\s*<([^>]+)>\s*)?(?:constexpr\s+)?(?:inline\s+)?(?:static\s+)?'
+        r'(\w+(?:\s*::\s*\w+)*)\s+' + re.escape(function_name) + r'\s*\(([^)]*)\)',
+        re.MULTILINE
+    )
+
+
 @dataclass
 class FunctionSignature:
     """Represents a parsed C++ function signature"""
@@ -26,22 +118,29 @@ class FunctionSignature:
     is_template: bool
     template_params: List[str]
     
-    @property
+    def __post_init__(self):
+        # Return types repeat across a header; interned, "void" is an identity check
+        self.return_type = sys.intern(self.return_type)
+        # Signatures are not modified after parsing, so classify the return type once
+        self._is_void = self.return_type is _VOID
+        self._is_bool = "bool" in self.return_type
+    
+    @cached_property
     def pattern_file(self) -> str:
         """Determine which test pattern file to use"""
-        if self.return_type == "void":
+        if self._is_void:
             return "test_set_bit_runtime.cpp"  # void-modifying functions
-        elif self.return_type == "bool" or "bool" in self.return_type:
+        elif self._is_bool:
             return "test_is_bit_set_runtime.cpp"  # bool-returning functions
         else:
             return "test_set_bit_runtime.cpp"  # default to void pattern
     
-    @property
+    @cached_property
     def test_type(self) -> str:
         """Determine test type for prompt generation"""
-        if self.return_type == "void":
+        if self._is_void:
             return "void-modifying"
-        elif self.return_type == "bool" or "bool" in self.return_type:
+        elif self._is_bool:
             return "bool-returning"
         else:
             return "value-returning"
@@ -52,41 +151,27 @@ class FunctionParser:
     
     def __init__(self, header_content: str):
         self.header_content = header_content
-        # Remove comments to avoid false matches
-        self.cleaned_content = self._remove_comments(header_content)
     
-    def _remove_comments(self, content: str) -> str:
-        """Remove C++ comments from content"""
-        # Remove single-line comments
-        content = re.sub(r'//.*$', '', content, flags=re.MULTILINE)
-        # Remove multi-line comments
-        content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
-        return content
+    @cached_property
+    def cleaned_content(self) -> str:
+        """Header with comments removed to avoid false matches (stripped on first use)"""
+        return _strip_comments(self.header_content)
+    
+    @classmethod
+    def clear_pattern_cache(cls) -> None:
+        """Drop the compiled per-function-name patterns"""
+        _func_pattern.cache_clear()
     
     def find_function(self, function_name: str) -> Optional[FunctionSignature]:
         """Find and parse a function signature by name"""
-        
-        # Pattern to match function declarations/definitions
-        # Matches: [template<...>] [constexpr] [inline] return_type function_name(params)
-        pattern = rf'''
-            (?:template\s*<([^>]+)>\s*)?          # Optional template parameters
-            (?:constexpr\s+)?                      # Optional constexpr
-            (?:inline\s+)?                         # Optional inline
-            (?:static\s+)?                         # Optional static
-            (\w+(?:\s*::\s*\w+)*)\s+              # Return type (including namespace)
-            ({re.escape(function_name)})\s*       # Function name
-            \(([^)]*)\)                            # Parameters
-        '''
-        
-        match = re.search(pattern, self.cleaned_content, re.VERBOSE | re.MULTILINE)
+        match = _func_pattern(function_name).search(self.cleaned_content)
         
         if not match:
             return None
         
         template_params_str = match.group(1)
         return_type = match.group(2).strip()
-        func_name = match.group(3)
-        params_str = match.group(4).strip()
+        params_str = match.group(3).strip()
         
         # Parse template parameters
         is_template = template_params_str is not None
@@ -102,11 +187,11 @@ class FunctionParser:
             parameters = [p.strip() for p in params if p.strip()]
         
         # Check if function modifies references
-        modifies_reference = any('&' in p and 'const' not in p.lower() 
+        modifies_reference = any('&' in p and not _CONST_RE.search(p)
                                for p in parameters)
         
         return FunctionSignature(
-            name=func_name,
+            name=function_name,
             return_type=return_type,
             parameters=parameters,
             modifies_reference=modifies_reference,
@@ -120,51 +205,111 @@ class FunctionParser:
         
         Bug #14 fix: Now handles function pointer parameters properly.
         """
+        # Common case, no nesting at all: every comma splits
+        if not any(c in params_str for c in '<>()'):
+            params = params_str.split(',')
+            if not params[-1]:
+                params.pop()  # Like the scan below, no empty piece after a trailing comma
+            return params
+        
         params = []
-        current = []
+        start = 0
         template_depth = 0
         paren_depth = 0
         
-        for char in params_str:
+        # Jump between delimiters instead of visiting every character
+        for delimiter in _PARAM_DELIM_RE.finditer(params_str):
+            char = delimiter.group()
             if char == '<':
                 template_depth += 1
-                current.append(char)
             elif char == '>':
                 template_depth -= 1
-                current.append(char)
             elif char == '(':
                 paren_depth += 1
-                current.append(char)
             elif char == ')':
                 paren_depth -= 1
-                current.append(char)
-            elif char == ',' and template_depth == 0 and paren_depth == 0:
+            elif template_depth == 0 and paren_depth == 0:
                 # Only split on commas outside templates and parentheses
-                params.append(''.join(current))
-                current = []
-            else:
-                current.append(char)
+                params.append(params_str[start:delimiter.start()])
+                start = delimiter.end()
         
-        if current:
-            params.append(''.join(current))
+        if start < len(params_str):
+            params.append(params_str[start:])
         
         return params
     
-    def list_all_functions(self) -> List[str]:
-        """List all function names found in header"""
-        # Pattern to match function names
-        pattern = r'(?:template\s*<[^>]+>\s*)?(?:constexpr\s+)?(?:inline\s+)?(?:static\s+)?\w+(?:\s*::\s*\w+)*\s+(\w+)\s*\([^)]*\)'
+    def parse_all(self, function_names: Optional[Iterable[str]] = None) -> Dict[str, FunctionSignature]:
+        """
+        Parse several function signatures from the same header.
         
-        matches = re.finditer(pattern, self.cleaned_content, re.MULTILINE)
-        functions = [m.group(1) for m in matches]
+        Args:
+            function_names: Functions to look up (default: every function in the header)
+        
+        Returns:
+            Signature per function name; names not found are left out
+        """
+        if function_names is None:
+            function_names = self.list_all_functions()
+        
+        signatures = {}
+        for function_name in function_names:
+            signature = self.find_function(function_name)
+            if signature is not None:
+                signatures[function_name] = signature
+        return signatures
+    
+    def list_all_functions(self) -> Set[str]:
+        """List all function names found in header (without duplicates)"""
+        content = self.cleaned_content
+        functions = set()
+        # Declarations don't overlap: skip candidates inside the last parameter list
+        last_end = 0
         
-        # Filter out constructors, destructors, operators
-        functions = [f for f in functions 
-                    if not f.startswith('~') 
-                    and not f.startswith('operator')
-                    and f[0].islower()]  # Usually functions start with lowercase
+        for candidate in _CANDIDATE_RE.finditer(content):
+            name_start = candidate.start(1)
+            if name_start < last_end:
+                continue
+            
+            # The name must follow whitespace that follows a return type word
+            # ("void setBit", "std::uint32_t\nreadBits"); calls like "x = f(" don't
+            type_end = name_start
+            while type_end > 0 and content[type_end - 1].isspace():
+                type_end -= 1
+            if type_end == name_start or type_end == 0:
+                continue
+            previous = content[type_end - 1]
+            if not (previous.isalnum() or previous == '_'):
+                continue
+            
+            params = _PARAM_LIST_RE.match(content, candidate.end(1))
+            if not params:
+                continue
+            last_end = params.end()
+            functions.add(candidate.group(1))
         
-        return list(set(functions))  # Remove duplicates
+        # Filter out keywords, constructors, destructors, operators
+        return {f for f in functions
+                if f not in _NOT_FUNCTION_NAMES
+                and not f.startswith(('~', 'operator'))
+                and f[0].islower()}  # Usually functions start with lowercase
+
+
+def _to_camel(name: str) -> str:
+    """Convert snake_case to camelCase"""
+    return _CAMEL_RE.sub(lambda m: m.group(1).upper(), name)
+
+
+@lru_cache(maxsize=32)
+def _read_and_parse(path_str: str, mtime_ns: int, size: int) -> FunctionParser:
+    """Parser over a header file; the stat fields in the key invalidate it when the file changes"""
+    with open(path_str, 'r') as f:
+        return FunctionParser(f.read())
+
+
+def _parser_for(header_path: Path) -> FunctionParser:
+    """Shared parser for a header, so validation and discovery read and strip it once"""
+    st = Path(header_path).stat()
+    return _read_and_parse(str(header_path), st.st_mtime_ns, st.st_size)
 
 
 def validate_function_exists(header_path: Path, function_name: str) -> Optional[FunctionSignature]:
@@ -179,10 +324,7 @@ def validate_function_exists(header_path: Path, function_name: str) -> Optional[
         FunctionSignature if found, None otherwise
     """
     try:
-        with open(header_path, 'r') as f:
-            content = f.read()
-        
-        parser = FunctionParser(content)
+        parser = _parser_for(header_path)
         signature = parser.find_function(function_name)
         
         return signature
@@ -204,23 +346,21 @@ def discover_testable_functions(header_path: Path, tests_dir: Path) -> List[str]
         List of function names that don't have tests yet
     """
     try:
-        with open(header_path, 'r') as f:
-            content = f.read()
-        
-        parser = FunctionParser(content)
+        parser = _parser_for(header_path)
         all_functions = parser.list_all_functions()
         
         # Find functions that already have tests
         tested_functions = set()
         if tests_dir.exists():
-            for test_file in tests_dir.glob("test_*_runtime.cpp"):
-                # Extract function name from test filename
-                # test_set_bit_runtime.cpp -> setBit
-                name_part = test_file.stem.replace('test_', '').replace('_runtime', '')
-                # Convert snake_case to camelCase
-                parts = name_part.split('_')
-                func_name = parts[0] + ''.join(p.capitalize() for p in parts[1:])
-                tested_functions.add(func_name)
+            # scandir yields bare names without building a Path per entry
+            with os.scandir(tests_dir) as entries:
+                for entry in entries:
+                    # Extract function name from test filename
+                    # test_set_bit_runtime.cpp -> setBit
+                    match = _TEST_FN_RE.match(entry.name)
+                    if not match:
+                        continue
+                    tested_functions.add(_to_camel(match.group(1)))
         
         # Return functions without tests
         return [f for f in all_functions if f not in tested_functions]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Persistent Claude Response Cache
+
+Stores Claude responses on disk keyed by a SHA-256 of the full request
+(model, system, prompt, temperature, max_tokens), so re-running the
+generator for an unchanged function/header/pattern does not spend API
+budget again. Changing any request parameter, including the model,
+changes the key.
+
+Each entry is served at most once per process: if the same request comes
+up again in a run (e.g. a fix prompt whose cached answer did not make
+the tests pass), it goes to Claude instead of looping on the same reply.
+
+Entries behind a function whose tests did not pass are discarded, so a
+rerun of that function gets a fresh answer instead of the same failure.
+
+Responses are only reproducible at temperature 0; at the default
+temperature a cache hit returns one plausible answer, not the only one.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Kept outside the library repo so cache files never end up in the generated PR
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "armcortexm-testgen" / "llm_cache"
+
+
+class LLMCache:
+    """Disk cache of Claude responses, one JSON file per request"""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, ttl_days: Optional[float] = None):
+        """
+        Args:
+            cache_dir: Directory holding the cache entries
+            ttl_days: Entries older than this are ignored (None = never expire)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl_days = ttl_days
+        self.hits = 0
+        self.misses = 0
+        # Keys already returned (or stored) by this process
+        self._used_keys: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        """Compute the cache key for a Messages API request"""
+        payload = json.dumps(request, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response text, or None on a miss"""
+        with self._lock:
+            if key in self._used_keys:
+                logger.debug("Cached response already used in this run, bypassing cache")
+                self.misses += 1
+                return None
+            self._used_keys.add(key)
+
+        entry_path = self._entry_path(key)
+        try:
+            entry = json.loads(entry_path.read_text())
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.ttl_days is not None and time.time() - entry["created"] > self.ttl_days * 86400:
+            logger.debug(f"Cache entry expired: {entry_path.name}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry["text"]
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """Delete entries (e.g. responses that led to a failed test); missing ones are ignored"""
+        for key in keys:
+            try:
+                self._entry_path(key).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not delete cache entry {key}: {e}")
+
+    def set(self, key: str, text: str, model: str) -> None:
+        """Store a response; failures are logged and otherwise ignored"""
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path.with_suffix(".tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps({
+                "model": model,
+                "created": time.time(),
+                "text": text
+            }))
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {entry_path}: {e}")
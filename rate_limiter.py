@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Proactive API Rate Limiting
+
+Token buckets for requests/minute and tokens/minute, shared by every
+thread that calls Claude. Callers reserve capacity before sending a
+request and settle it with the actual usage afterwards, so concurrent
+workers are paced below the account limits instead of running into 429s
+and backing off.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Continuously refilling bucket; not thread-safe on its own"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it already is)"""
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class ConcurrencyController:
+    """Requests-per-minute and tokens-per-minute limiter"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        """
+        Args:
+            requests_per_minute: Request limit of the API key's tier
+            tokens_per_minute: Input + output token limit of the tier
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._condition = threading.Condition()
+
+    def reserve(self, tokens: int) -> int:
+        """
+        Block until one request and `tokens` tokens fit, then take them.
+
+        Returns:
+            Tokens actually reserved (capped at the bucket size, so a
+            single oversized request can still go through); pass this to
+            settle() once the real usage is known.
+        """
+        tokens = min(tokens, int(self.tokens.capacity))
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    self.requests.level -= 1
+                    self.tokens.level -= tokens
+                    return tokens
+                # Woken early when another thread settles a reservation
+                self._condition.wait(wait)
+
+    def settle(self, reserved: int, used: int) -> None:
+        """
+        Replace a reservation with the tokens the request actually used.
+
+        Over-reservations are refunded; under-reservations are charged, and
+        may leave the bucket negative until it refills.
+        """
+        with self._condition:
+            self.tokens.refill(time.monotonic())
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved - used)
+            self._condition.notify_all()
@@ -16,7 +16,9 @@ import os
 import sys
 from pathlib import Path
 import subprocess
-from typing import Optional, Dict, Any
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Set
 import json
 
 import click
@@ -27,6 +29,7 @@ from rich.markdown import Markdown
 from anthropic import Anthropic
 
 import config
+from check_directives import extract_asm_functions, parse_check_blocks
 
 console = Console()
 client = Anthropic(api_key=config.ANTHROPIC_API_KEY)
@@ -34,6 +37,13 @@ client = Anthropic(api_key=config.ANTHROPIC_API_KEY)
 # Standardized error prefix for consistent error checking (Bug #11 fix)
 ERROR_PREFIX = "ERROR: "
 
+# Optimization levels every test is built and checked at
+OPTIMIZATIONS = ["Debug", "MinSize", "MaxSpeed"]
+
+# Prompt-cache pricing relative to the base input rate
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
 
 class TestGenerator:
     """Single-agent test generator"""
@@ -44,41 +54,84 @@ class TestGenerator:
         self.module = module  # Bug #10 fix: Add module support
         self.total_input_tokens = 0
         self.total_output_tokens = 0
-        
+        self.total_cache_creation_tokens = 0
+        self.total_cache_read_tokens = 0
+        # Presets configured by this process; configure is idempotent, so it is not rerun
+        self._configured: Set[str] = set()
+        # Absolute path per relative path passed to read_file/write_file
+        self._paths: Dict[str, Path] = {}
+        # The optimization levels build concurrently, so split the cores between them
+        self.build_jobs = max(1, (os.cpu_count() or 2) // len(OPTIMIZATIONS))
+        
+        # Inputs that do not change during a run are read once up front;
+        # failed reads keep the ERROR_PREFIX message and are reported where used
+        test_dir = self.get_test_dir()
+        self._header = self.read_file(str(self.get_header_path().relative_to(self.repo_path)))
+        # Assume we use first available pattern
+        self._pattern_path = next(test_dir.glob("test_*_runtime.cpp"), None)
+        self._existing_pattern = (self.read_file(str(self._pattern_path.relative_to(self.repo_path)))
+                                  if self._pattern_path is not None else None)
+        self._cmake_content = self.read_file(str((test_dir / "CMakeLists.txt").relative_to(self.repo_path)))
+        
+    def _path(self, relative_path: str) -> Path:
+        """Absolute path of a repository file, built once per relative path"""
+        full_path = self._paths.get(relative_path)
+        if full_path is None:
+            full_path = self._paths[relative_path] = self.repo_path / relative_path
+        return full_path
+    
     def read_file(self, relative_path: str) -> str:
         """Read a file from the repository"""
-        full_path = self.repo_path / relative_path
+        full_path = self._path(relative_path)
         try:
-            with open(full_path, 'r') as f:
-                return f.read()
+            return full_path.read_text(encoding='utf-8')
         except Exception as e:
             # Bug #11 fix: Use standardized error prefix
             return f"{ERROR_PREFIX}Error reading {relative_path}: {e}"
     
     def write_file(self, relative_path: str, content: str) -> bool:
         """Write content to a file"""
-        full_path = self.repo_path / relative_path
+        full_path = self._path(relative_path)
         try:
             full_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(full_path, 'w') as f:
-                f.write(content)
+            full_path.write_text(content, encoding='utf-8')
             return True
         except Exception as e:
             console.print(f"[red]Error writing {relative_path}: {e}[/red]")
             return False
     
-    def call_claude(self, prompt: str, max_tokens: int = 8000) -> str:
-        """Make an API call to Claude"""
+    def call_claude(self, prompt: str, max_tokens: int = 8000, cached_prefix: Optional[str] = None) -> str:
+        """
+        Make an API call to Claude
+        
+        Args:
+            prompt: Request text (the part that changes between calls)
+            max_tokens: Output token limit
+            cached_prefix: Context that stays the same across calls; sent
+                first and marked for prompt caching so repeats within the
+                cache lifetime are billed as cache reads
+        """
+        content: List[Dict[str, Any]] = []
+        if cached_prefix:
+            content.append({
+                "type": "text",
+                "text": cached_prefix,
+                "cache_control": {"type": "ephemeral"}
+            })
+        content.append({"type": "text", "text": prompt})
+        
         response = client.messages.create(
             model=config.MODEL,
             max_tokens=max_tokens,
             temperature=config.TEMPERATURE["simple"],
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": content}]
         )
         
-        # Track token usage
+        # Track token usage (input_tokens excludes cached prefix tokens)
         self.total_input_tokens += response.usage.input_tokens
         self.total_output_tokens += response.usage.output_tokens
+        self.total_cache_creation_tokens += getattr(response.usage, "cache_creation_input_tokens", None) or 0
+        self.total_cache_read_tokens += getattr(response.usage, "cache_read_input_tokens", None) or 0
         
         return response.content[0].text
     
@@ -95,24 +148,21 @@ class TestGenerator:
         
         console.print("\n[bold cyan]Step 1: Reading existing patterns...[/bold cyan]")
         
-        # Bug #10 fix: Use dynamic paths based on module
-        test_dir = self.get_test_dir()
-        
-        # Read existing test pattern (assume we use first available pattern)
-        pattern_files = list(test_dir.glob("test_*_runtime.cpp"))
-        if not pattern_files:
-            console.print(f"[red]{ERROR_PREFIX}No test patterns found in {test_dir}[/red]")
+        # Existing test pattern, read in __init__
+        if self._pattern_path is None:
+            # Bug #10 fix: Use dynamic paths based on module
+            console.print(f"[red]{ERROR_PREFIX}No test patterns found in {self.get_test_dir()}[/red]")
             return None
         
-        existing_test = self.read_file(str(pattern_files[0].relative_to(self.repo_path)))
+        existing_test = self._existing_pattern
         # Bug #11 fix: Use standardized error checking
         if existing_test.startswith(ERROR_PREFIX):
             console.print(f"[red]{existing_test}[/red]")
             return None
         
-        # Read the header file
+        # Header file, read in __init__
         header_path = self.get_header_path()
-        header = self.read_file(str(header_path.relative_to(self.repo_path)))
+        header = self._header
         if header.startswith(ERROR_PREFIX):
             console.print(f"[red]{header}[/red]")
             return None
@@ -121,9 +171,9 @@ class TestGenerator:
         
         console.print("\n[bold cyan]Step 2: Generating test code...[/bold cyan]")
         
-        prompt = f"""You are an expert in ARM Cortex-M assembly and C++ embedded systems testing.
-
-TASK: Generate a comprehensive test file for the {self.function_name}() function.
+        # Header and example pattern do not depend on the function, so runs for other
+        # functions of the same module within the cache lifetime reuse this prefix
+        context = f"""You are an expert in ARM Cortex-M assembly and C++ embedded systems testing.
 
 CONTEXT:
 Here's the function definition from {header_path.name}:
@@ -134,7 +184,9 @@ Here's the function definition from {header_path.name}:
 Here's an example test file showing the pattern to follow:
 ```cpp
 {existing_test}
-```
+```"""
+        
+        prompt = f"""TASK: Generate a comprehensive test file for the {self.function_name}() function.
 
 REQUIREMENTS:
 1. Create test_{self.function_name.lower()}_runtime.cpp
@@ -153,51 +205,68 @@ CRITICAL REMINDERS:
 
 OUTPUT: The complete C++ test file, nothing else. No explanations, just code."""
 
-        test_code = self.call_claude(prompt)
+        test_code = self.call_claude(prompt, cached_prefix=context)
         console.print("[green]✓ Generated test code[/green]")
         
         return test_code
     
-    def compile_and_test(self, test_name: str, optimization: str = "Debug") -> Dict[str, Any]:
-        """Compile and run tests"""
+    def compile_and_test(self, test_name: str, optimization: str = "Debug", quiet: bool = True) -> Dict[str, Any]:
+        """
+        Compile and run tests
+        
+        Args:
+            test_name: CMake target / CTest name of the test
+            optimization: Optimization level (Debug, MinSize, MaxSpeed)
+            quiet: Discard configure/build stdout and only decode the test
+                output when the tests fail ("output" is empty on success)
+        """
         preset = f"m0-gcc-{optimization.lower()}"
+        # Errors are reported from stderr, so stdout is only kept when not quiet
+        build_stdout = subprocess.DEVNULL if quiet else subprocess.PIPE
         
         try:
-            # Configure
-            result = subprocess.run(
-                ["cmake", "--preset", preset],
-                cwd=self.repo_path,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            if result.returncode != 0:
-                return {"success": False, "error": f"CMake configure failed: {result.stderr}"}
+            # Configure (once per preset; the build re-runs CMake if CMakeLists.txt changes)
+            if preset not in self._configured:
+                result = subprocess.run(
+                    ["cmake", "--preset", preset],
+                    cwd=self.repo_path,
+                    stdout=build_stdout,
+                    stderr=subprocess.PIPE,
+                    timeout=60
+                )
+                if result.returncode != 0:
+                    return {"success": False, "error": f"CMake configure failed: {result.stderr.decode(errors='replace')}"}
+                self._configured.add(preset)
             
             # Build
             result = subprocess.run(
-                ["cmake", "--build", "--preset", preset, "--target", test_name],
+                ["cmake", "--build", "--preset", preset, "--target", test_name,
+                 "--parallel", str(self.build_jobs)],
                 cwd=self.repo_path,
-                capture_output=True,
-                text=True,
+                stdout=build_stdout,
+                stderr=subprocess.PIPE,
                 timeout=120
             )
             if result.returncode != 0:
-                return {"success": False, "error": f"Build failed: {result.stderr}"}
+                return {"success": False, "error": f"Build failed: {result.stderr.decode(errors='replace')}"}
             
             # Run tests
-            result = subprocess.run(
-                ["ctest", "--preset", preset, "-R", test_name, "-V"],
-                cwd=self.repo_path,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            command = ["ctest", "--preset", preset, "-R", test_name, "-V", "-j", str(self.build_jobs)]
+            if not quiet:
+                result = subprocess.run(command, cwd=self.repo_path, capture_output=True, text=True, timeout=30)
+                return {
+                    "success": result.returncode == 0,
+                    "output": result.stdout + result.stderr
+                }
             
-            return {
-                "success": result.returncode == 0,
-                "output": result.stdout + result.stderr
-            }
+            # Verbose ctest output goes to a temporary file and is only read back on failure
+            with tempfile.TemporaryFile() as output:
+                result = subprocess.run(command, cwd=self.repo_path, stdout=output,
+                                        stderr=subprocess.STDOUT, timeout=30)
+                if result.returncode == 0:
+                    return {"success": True, "output": ""}
+                output.seek(0)
+                return {"success": False, "output": output.read().decode(errors='replace')}
             
         except subprocess.TimeoutExpired:
             return {"success": False, "error": "Compilation timeout"}
@@ -215,8 +284,16 @@ OUTPUT: The complete C++ test file, nothing else. No explanations, just code."""
             # Bug #11 fix: Use standardized error prefix
             return f"{ERROR_PREFIX}Assembly file not found: {asm_path}"
         
-        with open(asm_path, 'r') as f:
-            return f.read()
+        # Binary read skips newline translation; objdump output is plain ASCII
+        return asm_path.read_bytes().decode('utf-8', 'replace')
+    
+    @staticmethod
+    def relevant_assembly(asm: str, test_code: str) -> str:
+        """Trim a disassembly to the functions the test's CHECK-LABELs refer to"""
+        functions = {block.function for block in parse_check_blocks(test_code)}
+        relevant = extract_asm_functions(asm, functions) if functions else ""
+        # Fall back to the whole file if the labels don't match anything
+        return relevant or asm
     
     def fix_check_directives(self, test_code: str, test_name: str) -> Optional[str]:
         """Fix CHECK directives based on actual assembly"""
@@ -225,24 +302,20 @@ OUTPUT: The complete C++ test file, nothing else. No explanations, just code."""
         
         # Read assembly for all optimization levels
         assemblies = {}
-        for opt in ["Debug", "MinSize", "MaxSpeed"]:
+        for opt in OPTIMIZATIONS:
             asm = self.read_assembly(test_name, opt)
             # Bug #11 fix: Use standardized error checking
             if not asm.startswith(ERROR_PREFIX):
-                assemblies[opt] = asm
+                # Only the checked functions go into the prompt
+                assemblies[opt] = self.relevant_assembly(asm, test_code)
         
         if not assemblies:
             console.print("[red]No assembly files found![/red]")
             return None
         
-        prompt = f"""You are an expert in ARM assembly and FileCheck directives.
-
-TASK: Fix the CHECK directives in the test file to match the actual assembly output.
-
-TEST FILE:
-```cpp
-{test_code}
-```
+        # Fixing CHECK lines does not change the code, so the assembly usually
+        # repeats between attempts and is sent as the cached prefix
+        context = f"""You are an expert in ARM assembly and FileCheck directives.
 
 ACTUAL ASSEMBLY OUTPUTS:
 
@@ -259,6 +332,13 @@ MinSize:
 MaxSpeed:
 ```
 {assemblies.get('MaxSpeed', 'N/A')}
+```"""
+        
+        prompt = f"""TASK: Fix the CHECK directives in the test file to match the actual assembly output.
+
+TEST FILE:
+```cpp
+{test_code}
 ```
 
 REQUIREMENTS:
@@ -270,7 +350,7 @@ REQUIREMENTS:
 
 OUTPUT: The complete corrected test file, nothing else."""
 
-        fixed_code = self.call_claude(prompt)
+        fixed_code = self.call_claude(prompt, cached_prefix=context)
         console.print("[green]✓ Fixed CHECK directives[/green]")
         
         return fixed_code
@@ -307,7 +387,7 @@ OUTPUT: The complete corrected test file, nothing else."""
         
         # Update CMakeLists.txt
         cmake_path = test_dir / "CMakeLists.txt"
-        cmake_content = self.read_file(str(cmake_path.relative_to(self.repo_path)))
+        cmake_content = self._cmake_content
         # Bug #11 fix: Check for error before proceeding
         if cmake_content.startswith(ERROR_PREFIX):
             console.print(f"[red]Cannot read CMakeLists.txt: {cmake_content}[/red]")
@@ -319,6 +399,7 @@ OUTPUT: The complete corrected test file, nothing else."""
             cmake_content += f"add_asm_test({test_name})\n"
             if not self.write_file(str(cmake_path.relative_to(self.repo_path)), cmake_content):
                 return False
+            self._cmake_content = cmake_content
             console.print(f"[green]✓ Updated {cmake_path.relative_to(self.repo_path)}[/green]")
         
         # Try to compile
@@ -329,15 +410,18 @@ OUTPUT: The complete corrected test file, nothing else."""
             
             console.print(f"\n[yellow]Compilation attempt {attempts}/{config.MAX_COMPILATION_ATTEMPTS}...[/yellow]")
             
-            all_passed = True
-            for opt in ["Debug", "MinSize", "MaxSpeed"]:
-                result = self.compile_and_test(test_name, opt)
-                
+            # Each preset builds into its own directory, so the levels can run side by side
+            with ThreadPoolExecutor(max_workers=len(OPTIMIZATIONS)) as executor:
+                futures = {opt: executor.submit(self.compile_and_test, test_name, opt) for opt in OPTIMIZATIONS}
+                results = {opt: future.result() for opt, future in futures.items()}
+            
+            # Report in a fixed order once everything has finished
+            for opt, result in results.items():
                 if result["success"]:
                     console.print(f"[green]✓ {opt} tests passed[/green]")
                 else:
                     console.print(f"[red]✗ {opt} tests failed[/red]")
-                    all_passed = False
+            all_passed = all(result["success"] for result in results.values())
             
             if all_passed:
                 console.print("\n[bold green]✓ All tests passed![/bold green]")
@@ -362,8 +446,11 @@ OUTPUT: The complete corrected test file, nothing else."""
     def print_summary(self, success: bool):
         """Print summary of the generation"""
         input_cost = (self.total_input_tokens / 1_000_000) * config.INPUT_TOKEN_COST
+        cache_cost = ((self.total_cache_creation_tokens * CACHE_WRITE_MULTIPLIER
+                       + self.total_cache_read_tokens * CACHE_READ_MULTIPLIER)
+                      / 1_000_000) * config.INPUT_TOKEN_COST
         output_cost = (self.total_output_tokens / 1_000_000) * config.OUTPUT_TOKEN_COST
-        total_cost = input_cost + output_cost
+        total_cost = input_cost + cache_cost + output_cost
         
         summary = f"""
 [bold]Generation Summary[/bold]
@@ -374,6 +461,7 @@ Module: {self.module}
 
 [bold]Token Usage:[/bold]
   Input:  {self.total_input_tokens:,} tokens (${input_cost:.4f})
+  Cache:  {self.total_cache_creation_tokens:,} written, {self.total_cache_read_tokens:,} read (${cache_cost:.4f})
   Output: {self.total_output_tokens:,} tokens (${output_cost:.4f})
   Total:  ${total_cost:.4f}
 
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Smoke tests of the --use-batch-api path with a mocked Anthropic client
+
+Run with: python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+HEADER = """
+template<std::integral T>
+constexpr void setBit(T& value, uint8_t n) {
+    value |= T{1} << n;
+}
+"""
+
+PATTERN = """// CHECK-LABEL: <test_set_bit_u8_0>:
+// CHECK-NEXT: ldrb r3, [r0, #0]
+// CHECK-EMPTY:
+"""
+
+
+def batch_result(custom_id: str, text: str) -> SimpleNamespace:
+    """A succeeded entry as returned by messages.batches.results()"""
+    usage = SimpleNamespace(input_tokens=1000, output_tokens=2000,
+                            cache_creation_input_tokens=0, cache_read_input_tokens=0)
+    message = SimpleNamespace(usage=usage, content=[SimpleNamespace(text=text)])
+    return SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type="succeeded", message=message))
+
+
+@unittest.skipUnless(importlib.util.find_spec("anthropic"), "anthropic is not installed")
+class BatchApiTest(unittest.TestCase):
+    """generate_tests_batch_api against a mocked client"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        # The generator module logs to testgen.log in the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(temp_dir.name)
+
+        import autonomous_test_generator
+        self.module = autonomous_test_generator
+
+        self.repo = Path(temp_dir.name) / "repo"
+        (self.repo / "tests" / "bit_utils").mkdir(parents=True)
+        (self.repo / "bit_utils.hpp").write_text(HEADER)
+        (self.repo / "tests" / "bit_utils" / "test_set_bit_runtime.cpp").write_text(PATTERN)
+
+        self.client = mock.MagicMock()
+        self.client.messages.count_tokens.return_value = SimpleNamespace(input_tokens=1000)
+        self.client.messages.batches.create.return_value = SimpleNamespace(
+            id="batch_1", processing_status="ended", request_counts=SimpleNamespace(processing=0)
+        )
+        self.client.messages.batches.results.return_value = [batch_result("setBit", "// generated")]
+
+    def make_generator(self, max_cost: float = 50.0):
+        generator = self.module.AutonomousTestGenerator(
+            repo_path=self.repo, api_key="test-key", max_cost=max_cost, use_batch_api=True
+        )
+        generator.client = self.client
+        return generator
+
+    def test_batch_results_are_returned_and_billed(self):
+        generator = self.make_generator()
+        signatures = generator.validate_functions(["setBit"])
+
+        generated = generator.generate_tests_batch_api(signatures)
+
+        self.assertEqual(generated, {"setBit": "// generated"})
+        self.client.messages.batches.create.assert_called_once()
+        self.assertGreater(generator.total_cost, 0.0)
+        self.assertEqual(generator.total_output_tokens, 2000)
+        self.assertEqual(generator.reserved_cost, 0.0)
+
+    def test_batch_respects_max_cost(self):
+        generator = self.make_generator(max_cost=0.001)
+        signatures = generator.validate_functions(["setBit"])
+
+        with self.assertRaises(RuntimeError):
+            generator.generate_tests_batch_api(signatures)
+
+        self.client.messages.batches.create.assert_not_called()
+        self.assertEqual(generator.reserved_cost, 0.0)
+
+    def test_bulk_failure_falls_back_to_individual_generation(self):
+        generator = self.make_generator()
+        generator.generate_tests_batch_api = mock.Mock(side_effect=RuntimeError("Cost limit $1 would be exceeded!"))
+        generator.generate_test = mock.Mock(return_value=True)
+
+        summary = generator.run(["setBit"])
+
+        self.assertEqual(summary["results"], {"setBit": {"success": True, "error": None}})
+        generator.generate_test.assert_called_once()
+
+    def test_missing_header_fails_each_function(self):
+        (self.repo / "bit_utils.hpp").unlink()
+        generator = self.make_generator()
+
+        summary = generator.run(["setBit", "clearBit"])
+
+        self.assertEqual(sorted(summary["results"]), ["clearBit", "setBit"])
+        self.assertFalse(summary["all_passed"])
+        self.client.messages.batches.create.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests of AutonomousTestGenerator.call_claude with a mocked streaming client
+
+Run with: python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class FakeStream:
+    """Stand-in for the context manager returned by messages.stream()"""
+
+    def __init__(self, text: str, stop_reason: str = "end_turn", output_tokens: int = 100):
+        self.text_stream = iter([text])
+        self.message = SimpleNamespace(
+            stop_reason=stop_reason,
+            usage=SimpleNamespace(input_tokens=100, output_tokens=output_tokens,
+                                  cache_creation_input_tokens=0, cache_read_input_tokens=0)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def get_final_message(self):
+        return self.message
+
+
+@unittest.skipUnless(importlib.util.find_spec("anthropic"), "anthropic is not installed")
+class CallClaudeTest(unittest.TestCase):
+    """Caching and budget handling of call_claude"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        # The generator module logs to testgen.log in the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(temp_dir.name)
+
+        import autonomous_test_generator
+        from llm_cache import LLMCache
+        self.module = autonomous_test_generator
+
+        self.cache = LLMCache(Path(temp_dir.name) / "cache")
+        self.client = mock.MagicMock()
+        self.client.messages.count_tokens.return_value = SimpleNamespace(input_tokens=100)
+
+    def make_generator(self, max_cost: float = 50.0):
+        generator = self.module.AutonomousTestGenerator(
+            repo_path=Path(os.getcwd()), api_key="test-key", max_cost=max_cost, cache=self.cache
+        )
+        generator.client = self.client
+        return generator
+
+    def test_complete_response_is_cached(self):
+        self.client.messages.stream.return_value = FakeStream("// complete")
+        generator = self.make_generator()
+
+        with mock.patch.object(self.cache, "set", wraps=self.cache.set) as cache_set:
+            self.assertEqual(generator.call_claude("prompt", max_tokens=1000), "// complete")
+
+        cache_set.assert_called_once()
+        self.assertEqual(generator.reserved_cost, 0.0)
+
+    def test_truncated_response_is_not_cached(self):
+        self.client.messages.stream.return_value = FakeStream("// cut off", "max_tokens", 1000)
+        generator = self.make_generator()
+
+        with mock.patch.object(self.cache, "set") as cache_set, \
+                self.assertLogs(self.module.logger, level="ERROR"):
+            self.assertEqual(generator.call_claude("prompt", max_tokens=1000), "// cut off")
+
+        cache_set.assert_not_called()
+
+    def test_truncated_retry_reserves_only_the_retry(self):
+        # First call is cut off by the adaptive limit, the retry at the cap completes
+        self.client.messages.stream.side_effect = [
+            FakeStream("// cut", "max_tokens", 1000),
+            FakeStream("// complete", "end_turn", 1500)
+        ]
+        generator = self.make_generator()
+        generator.adaptive_max_tokens = mock.Mock(return_value=1000)
+        cost_of = generator.calculate_cost
+        # Room for what the first call spent plus the retry's reservation, not both reservations
+        generator.max_cost = cost_of(100, 1000) + cost_of(100, 10000) + 0.0001
+
+        self.assertEqual(generator.call_claude("prompt", max_tokens=10000, kind="initial"), "// complete")
+        self.assertEqual(self.client.messages.stream.call_count, 2)
+        self.assertEqual(generator.reserved_cost, 0.0)
+
+    def test_failed_retry_reservation_is_not_released_twice(self):
+        self.client.messages.stream.return_value = FakeStream("// cut", "max_tokens", 1000)
+        generator = self.make_generator()
+        generator.adaptive_max_tokens = mock.Mock(return_value=1000)
+        # Enough for the first call only
+        generator.max_cost = generator.calculate_cost(100, 1000) + 0.0001
+
+        with self.assertRaises(RuntimeError):
+            generator.call_claude("prompt", max_tokens=10000, kind="initial")
+        self.assertEqual(generator.reserved_cost, 0.0)
+
+    def run_generate_test(self, passes: bool) -> list:
+        """Run generate_test around one Claude call; returns the cache entries left"""
+        self.client.messages.stream.return_value = FakeStream("// complete")
+        generator = self.make_generator()
+
+        def attempt(signature, initial_code):
+            generator.call_claude("prompt", max_tokens=1000)
+            return passes
+
+        generator._generate_test = mock.Mock(side_effect=attempt)
+        signature = SimpleNamespace(name="setBit")
+        self.assertEqual(generator.generate_test(signature), passes)
+        return list(self.cache.cache_dir.glob("*.json"))
+
+    def test_responses_of_passing_function_stay_cached(self):
+        self.assertEqual(len(self.run_generate_test(passes=True)), 1)
+
+    def test_responses_of_failing_function_are_discarded(self):
+        self.assertEqual(self.run_generate_test(passes=False), [])
+
+    def test_log_lines_name_their_function(self):
+        generator = self.make_generator()
+        generator._generate_test = mock.Mock(side_effect=lambda *args: self.module.logger.info("ATTEMPT 1/3"))
+
+        with self.assertLogs(self.module.logger, level="INFO") as logs:
+            generator.generate_test(SimpleNamespace(name="setBit"))
+            self.module.logger.info("Outside any function")
+
+        self.assertIn("[setBit] ATTEMPT 1/3", logs.output[0])
+        self.assertTrue(logs.output[-1].endswith(":Outside any function"))
+
+
+if __name__ == "__main__":
+    unittest.main()
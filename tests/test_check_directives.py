@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Tests of the local CHECK directive repair
+
+Run with: python -m unittest discover tests
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from check_directives import (  # noqa: E402
+    normalize_instruction,
+    parse_asm_functions,
+    parse_check_blocks,
+    repair_check_directives,
+)
+
+
+def objdump(*functions) -> str:
+    """Disassembly in objdump -d layout; each function is (name, [(encoding, instruction), ...])"""
+    sections = ["\ntest.o:     file format elf32-littlearm\n\n\nDisassembly of section .text:\n"]
+    address = 0
+    for name, instructions in functions:
+        lines = [f"{address:08x} <{name}>:"]
+        for encoding, instruction in instructions:
+            lines.append(f"{address:4x}:\t{encoding:<10}\t{instruction}")
+            address += 2 if len(encoding) == 4 else 4
+        sections.append("\n".join(lines) + "\n")
+    return "\n".join(sections)
+
+
+TEST_CODE = """#include "bit_utils.hpp"
+
+// CHECK-LABEL: <test_set_bit_u8_0>:
+// CHECK-NEXT: ldrb r3, [r0, #1]
+// CHECK-NEXT: bx lr
+// CHECK-EMPTY:
+extern "C" [[gnu::naked]] void test_set_bit_u8_0(uint8_t& value) { setBit(value, 0); }
+"""
+
+SET_BIT_ASM = objdump(("test_set_bit_u8_0", [("7803", "ldrb\tr3, [r0, #0]"), ("4770", "bx\tlr")]))
+
+
+class ParseTest(unittest.TestCase):
+    """parse_check_blocks, normalize_instruction, parse_asm_functions"""
+
+    def test_check_blocks(self):
+        blocks = parse_check_blocks(TEST_CODE)
+
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].prefix, "CHECK")
+        self.assertEqual(blocks[0].function, "test_set_bit_u8_0")
+        self.assertEqual(blocks[0].next_lines, [3, 4])
+        self.assertTrue(blocks[0].has_empty)
+
+    def test_check_blocks_per_prefix(self):
+        code = ("// MINSIZE-LABEL: <f>:\n// MINSIZE-NEXT: bx lr\n// MINSIZE-EMPTY:\n"
+                "// MAXSPEED-LABEL: <f>:\n// MAXSPEED-NEXT: bx lr\n// MAXSPEED-NEXT: nop\n")
+
+        blocks = parse_check_blocks(code)
+
+        self.assertEqual([block.prefix for block in blocks], ["MINSIZE", "MAXSPEED"])
+        self.assertEqual(blocks[1].next_lines, [4, 5])
+        self.assertFalse(blocks[1].has_empty)
+
+    def test_normalize_strips_address_encoding_and_comments(self):
+        self.assertEqual(normalize_instruction("   0:\t7803      \tldrb\tr3, [r0, #0]"), "ldrb r3, [r0, #0]")
+        self.assertEqual(normalize_instruction("   8:\t46c0      \tnop\t\t\t; (mov r8, r8)"), "nop")
+        self.assertEqual(normalize_instruction("  1c:\t4b01      \tldr\tr3, [pc, #4]\t@ (24 <f+0x24>)"),
+                         "ldr r3, [pc, #4]")
+        # 32-bit Thumb-2 encoding shown as two halfwords
+        self.assertEqual(normalize_instruction("   4:\tf7ff fffe \tbl\t0 <g>"), "bl 0 <g>")
+
+    def test_asm_functions(self):
+        asm = objdump(("f", [("7803", "ldrb\tr3, [r0, #0]"), ("4770", "bx\tlr")]),
+                      ("g", [("46c0", "nop\t\t\t; (mov r8, r8)")]))
+
+        self.assertEqual(parse_asm_functions(asm), {
+            "f": ["ldrb r3, [r0, #0]", "bx lr"],
+            "g": ["nop"],
+        })
+
+
+class RepairTest(unittest.TestCase):
+    """repair_check_directives"""
+
+    def test_rewrites_instruction_text_mismatch(self):
+        repaired = repair_check_directives(TEST_CODE, {"Debug": SET_BIT_ASM})
+
+        self.assertEqual(repaired, TEST_CODE.replace("[r0, #1]", "[r0, #0]"))
+
+    def test_nothing_to_change_returns_none(self):
+        fixed = TEST_CODE.replace("[r0, #1]", "[r0, #0]")
+
+        self.assertIsNone(repair_check_directives(fixed, {"Debug": SET_BIT_ASM}))
+
+    def test_regex_patterns_are_left_alone(self):
+        code = TEST_CODE.replace("bx lr", "{{bx|pop}} {{.*}}")
+
+        repaired = repair_check_directives(code, {"Debug": SET_BIT_ASM})
+
+        self.assertIn("// CHECK-NEXT: {{bx|pop}} {{.*}}\n", repaired)
+        self.assertIn("// CHECK-NEXT: ldrb r3, [r0, #0]\n", repaired)
+
+    def test_missing_function_returns_none(self):
+        asm = objdump(("test_other", [("4770", "bx\tlr")]))
+
+        self.assertIsNone(repair_check_directives(TEST_CODE, {"Debug": asm}))
+
+    def test_different_instruction_count_returns_none(self):
+        asm = objdump(("test_set_bit_u8_0", [("7803", "ldrb\tr3, [r0, #0]"), ("2201", "movs\tr2, #1"),
+                                             ("4770", "bx\tlr")]))
+
+        self.assertIsNone(repair_check_directives(TEST_CODE, {"Debug": asm}))
+
+    def test_optimizations_sharing_a_prefix_must_agree(self):
+        other = objdump(("test_set_bit_u8_0", [("7843", "ldrb\tr3, [r0, #1]"), ("4770", "bx\tlr")]))
+
+        self.assertIsNone(repair_check_directives(TEST_CODE, {"Debug": SET_BIT_ASM, "MinSize": other}))
+
+    def test_per_optimization_prefixes_are_repaired_separately(self):
+        code = ("// DEBUG-LABEL: <f>:\n// DEBUG-NEXT: ldrb r3, [r0, #1]\n// DEBUG-EMPTY:\n"
+                "// MINSIZE-LABEL: <f>:\n// MINSIZE-NEXT: ldrb r3, [r0, #0]\n// MINSIZE-EMPTY:\n")
+        debug = objdump(("f", [("7803", "ldrb\tr3, [r0, #0]")]))
+        minsize = objdump(("f", [("7843", "ldrb\tr3, [r0, #1]")]))
+
+        repaired = repair_check_directives(code, {"Debug": debug, "MinSize": minsize})
+
+        self.assertEqual(repaired, code.replace("DEBUG-NEXT: ldrb r3, [r0, #1]", "DEBUG-NEXT: ldrb r3, [r0, #0]")
+                                      .replace("MINSIZE-NEXT: ldrb r3, [r0, #0]", "MINSIZE-NEXT: ldrb r3, [r0, #1]"))
+
+
+NOP = ("46c0", "nop\t\t\t; (mov r8, r8)")
+
+
+class PaddingTest(unittest.TestCase):
+    """Trailing NOP padding in repair_check_directives"""
+
+    def test_adds_nops_to_block_without_any(self):
+        code = "// MAXSPEED-LABEL: <f>:\n// MAXSPEED-NEXT: bx lr\n// MAXSPEED-EMPTY:\n"
+        asm = objdump(("f", [("4770", "bx\tlr"), NOP, NOP]))
+
+        repaired = repair_check_directives(code, {"MaxSpeed": asm})
+
+        self.assertEqual(repaired, "// MAXSPEED-LABEL: <f>:\n// MAXSPEED-NEXT: bx lr\n"
+                                   "// MAXSPEED-NEXT: nop\n// MAXSPEED-NEXT: nop\n// MAXSPEED-EMPTY:\n")
+
+    def test_removes_extra_nops(self):
+        code = ("// MAXSPEED-LABEL: <f>:\n// MAXSPEED-NEXT: bx lr\n"
+                "// MAXSPEED-NEXT: nop\n// MAXSPEED-NEXT: nop\n// MAXSPEED-NEXT: nop\n// MAXSPEED-EMPTY:\n")
+        asm = objdump(("f", [("4770", "bx\tlr"), NOP]))
+
+        repaired = repair_check_directives(code, {"MaxSpeed": asm})
+
+        self.assertEqual(repaired, "// MAXSPEED-LABEL: <f>:\n// MAXSPEED-NEXT: bx lr\n"
+                                   "// MAXSPEED-NEXT: nop\n// MAXSPEED-EMPTY:\n")
+
+    def test_several_blocks_in_one_file(self):
+        # Growing the first block and shrinking the last shifts line indices between them
+        code = ("// MAXSPEED-LABEL: <f>:\n// MAXSPEED-NEXT: bx lr\n// MAXSPEED-EMPTY:\n"
+                "// MAXSPEED-LABEL: <g>:\n// MAXSPEED-NEXT: movs r0, #2\n// MAXSPEED-NEXT: bx lr\n// MAXSPEED-EMPTY:\n"
+                "// MAXSPEED-LABEL: <h>:\n// MAXSPEED-NEXT: bx lr\n"
+                "// MAXSPEED-NEXT: nop\n// MAXSPEED-NEXT: nop\n// MAXSPEED-EMPTY:\n")
+        asm = objdump(("f", [("4770", "bx\tlr"), NOP]),
+                      ("g", [("2001", "movs\tr0, #1"), ("4770", "bx\tlr")]),
+                      ("h", [("4770", "bx\tlr")]))
+
+        repaired = repair_check_directives(code, {"MaxSpeed": asm})
+
+        self.assertEqual(repaired,
+                         "// MAXSPEED-LABEL: <f>:\n// MAXSPEED-NEXT: bx lr\n// MAXSPEED-NEXT: nop\n// MAXSPEED-EMPTY:\n"
+                         "// MAXSPEED-LABEL: <g>:\n// MAXSPEED-NEXT: movs r0, #1\n// MAXSPEED-NEXT: bx lr\n"
+                         "// MAXSPEED-EMPTY:\n"
+                         "// MAXSPEED-LABEL: <h>:\n// MAXSPEED-NEXT: bx lr\n// MAXSPEED-EMPTY:\n")
+
+    def test_block_without_check_next_lines_returns_none(self):
+        code = "// MAXSPEED-LABEL: <f>:\n// MAXSPEED-EMPTY:\n"
+        asm = objdump(("f", [NOP, NOP]))
+
+        self.assertIsNone(repair_check_directives(code, {"MaxSpeed": asm}))
+
+
+if __name__ == "__main__":
+    unittest.main()